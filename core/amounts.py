@@ -0,0 +1,37 @@
+from decimal import Context, Decimal
+
+# amounts are stored as integers in the asset's smallest unit
+ASSET_DECIMALS = {
+    'ASTR': 18,
+    'TON': 9,
+}
+DEFAULT_DECIMALS = 18
+
+# wide enough for any numeric(40, 0) amount to convert exactly
+_context = Context(prec=60)
+
+
+def asset_decimals(asset_symbol: str) -> int:
+    return ASSET_DECIMALS.get(asset_symbol, DEFAULT_DECIMALS)
+
+
+def to_base_units(value: str, decimals: int) -> int:
+    """Exact base units of a decimal string such as ``'1234.5'``."""
+    return int(Decimal(value).scaleb(decimals, _context).to_integral_value(context=_context))
+
+
+def from_base_units(amount: int, decimals: int) -> Decimal:
+    """Display value of a base-unit amount; only for rendering."""
+    return Decimal(int(amount)).scaleb(-decimals, _context)
+
+
+def rescale(amount: int, decimals: int, to_decimals: int) -> int:
+    """Base units of ``decimals`` in base units of ``to_decimals``, truncated."""
+    if to_decimals >= decimals:
+        return int(amount) * 10 ** (to_decimals - decimals)
+    return int(amount) // 10 ** (decimals - to_decimals)
+
+
+def whole_units(limit: int, decimals: int) -> int:
+    """A threshold given in whole tokens, in base units."""
+    return limit * 10 ** decimals
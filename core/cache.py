@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import time
+from typing import Callable, NamedTuple
+
+from celery.utils.log import get_task_logger
+from django.core.cache import cache
+
+logger = get_task_logger(__name__)
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 1024 * 1024))
+# entries outlive their ttl so an expired one can still be revalidated with its etag
+RESPONSE_CACHE_REVALIDATE = int(os.getenv('RESPONSE_CACHE_REVALIDATE', 3600))
+
+
+class CachedResponse(NamedTuple):
+    payload: object
+    digest: str
+    changed: bool
+    key: str
+
+    def commit(self) -> None:
+        """Mark the payload processed, so it is no longer reported as changed."""
+        cache.set(processed_key(self.key), self.digest, None)
+
+
+def payload_digest(payload) -> str:
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
+    ).hexdigest()
+
+
+def response_key(name: str, data) -> str:
+    return f'response:{name}:{payload_digest(data)}'
+
+
+def processed_key(key: str) -> str:
+    return f'{key}:processed'
+
+
+def cached_json(
+        name: str,
+        data,
+        ttl: int,
+        fetch: Callable,
+) -> [CachedResponse, None]:
+    """
+    Return the JSON body for (``name``, ``data``), from cache while fresh.
+
+    ``fetch(headers)`` performs the real request and returns a response
+    or None; it is given If-None-Match when an etag is known. ``changed``
+    is False once a caller has processed this payload and called
+    ``commit()``, so a run that fails halfway sees it changed again. An
+    upstream failure falls back to a stale entry when there is one.
+    """
+    key = response_key(name, data)
+    entries = cache.get_many([key, processed_key(key)])
+    entry = entries.get(key)
+    processed = entries.get(processed_key(key))
+    now = time.time()
+
+    def cached(payload, digest):
+        return CachedResponse(payload, digest, digest != processed, key)
+
+    if entry and now < entry['fresh_until']:
+        return cached(entry['payload'], entry['digest'])
+
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    response = fetch(headers)
+
+    if response is not None and response.status_code == 304 and entry:
+        entry['fresh_until'] = now + ttl
+        cache.set(key, entry, ttl + RESPONSE_CACHE_REVALIDATE)
+        return cached(entry['payload'], entry['digest'])
+
+    if response is None or response.status_code != 200:
+        if entry:
+            logger.info(f'cached_json: {name} serving stale entry')
+            return cached(entry['payload'], entry['digest'])
+        return
+
+    payload = response.json()
+    digest = payload_digest(payload)
+    if len(response.content) <= RESPONSE_CACHE_MAX_BYTES:
+        cache.set(key, {
+            'payload': payload,
+            'digest': digest,
+            'etag': response.headers.get('ETag', ''),
+            'fresh_until': now + ttl,
+        }, ttl + RESPONSE_CACHE_REVALIDATE)
+    return cached(payload, digest)
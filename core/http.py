@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import requests
+from celery.utils.log import get_task_logger
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.retry import Retry
+
+from core import metrics
+
+logger = get_task_logger(__name__)
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3.05))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 20))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', 10))
+HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', 3))
+HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', 0.5))
+HTTP_BACKOFF_JITTER = float(os.getenv('HTTP_BACKOFF_JITTER', 0.5))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# calls per upstream since process start, read by benchmarks and metrics
+http_calls = Counter()
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session(
+        retry_statuses: tuple,
+        retry_methods: tuple,
+) -> requests.Session:
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        backoff_jitter=HTTP_BACKOFF_JITTER,
+        status_forcelist=retry_statuses,
+        allowed_methods=retry_methods,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(
+        name: str,
+        retry_statuses: tuple = RETRY_STATUSES,
+        retry_methods: tuple = ('GET', 'POST'),
+) -> requests.Session:
+    """
+    Return the keep-alive session for an upstream, one per process.
+
+    Sessions are keyed by pid as well, so a celery prefork child never
+    reuses sockets inherited from its parent.
+    """
+    key = (name, os.getpid())
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _build_session(retry_statuses, retry_methods)
+                session.upstream = name
+                _sessions[key] = session
+    return session
+
+
+def connect_failed(error: requests.RequestException) -> bool:
+    """True when the request never reached the server, so resending it is safe."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def request(
+        session: requests.Session,
+        method: str,
+        url: str,
+        raise_errors: bool = False,
+        **kwargs,
+) -> [requests.Response, None]:
+    """
+    Send a request through ``session`` with metrics.
+
+    Network errors return None, or are re-raised with ``raise_errors``
+    for callers that must tell a failed connect from a lost response
+    (see connect_failed).
+    """
+    kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    upstream = getattr(session, 'upstream', '')
+    http_calls[upstream] += 1
+    started_at = time.monotonic()
+    try:
+        response = session.request(method, url, **kwargs)
+    except requests.RequestException as e:
+        # the url may carry a bot token, so only the host is logged
+        host = urlsplit(url).netloc
+        logger.info(f'request: {method} {host} {e.__class__.__name__}')
+        metrics.inc('http_requests_total', {'upstream': upstream, 'status': 'error'})
+        if raise_errors:
+            raise
+        return
+
+    metrics.observe(
+        'http_request_duration_seconds',
+        {'upstream': upstream},
+        time.monotonic() - started_at,
+    )
+    metrics.inc('http_requests_total', {'upstream': upstream, 'status': response.status_code})
+    return response
@@ -0,0 +1,81 @@
+import functools
+import threading
+import time
+
+import redis
+from celery.utils.log import get_task_logger
+from redis.exceptions import LockError
+
+from core import metrics
+
+logger = get_task_logger(__name__)
+
+SINGLE_FLIGHT_TTL = 60
+
+
+def _renew(lock, ttl: float, stop: threading.Event) -> None:
+    while not stop.wait(ttl / 3):
+        try:
+            lock.reacquire()
+        except (LockError, redis.RedisError) as e:
+            logger.info(f'single_flight: lease of {lock.name} lost: {e.__class__.__name__}')
+            return
+
+
+def single_flight(key=None, ttl: float = SINGLE_FLIGHT_TTL, wait: float = 0, coalesce: bool = True):
+    """
+    Let only one run of the decorated task body proceed at a time.
+
+    The Redis lock is a lease of ``ttl`` seconds renewed in the background
+    while the body runs, so a crashed worker frees it quickly and a slow
+    run keeps it. A run that cannot get the lock within ``wait`` seconds
+    is skipped; with ``coalesce`` the holder then runs once more before
+    releasing, so skipped ticks collapse into a single follow-up.
+    ``key`` maps the task arguments to a lock suffix for per-argument
+    locks. If Redis is unavailable the body runs unlocked.
+    """
+    def decorator(func):
+        name = f'{func.__module__}.{func.__name__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            lock_name = f'single-flight:{name}'
+            if key is not None:
+                lock_name += f':{key(*args, **kwargs)}'
+            pending_name = f'{lock_name}:pending'
+            labels = {'task': name}
+
+            started_at = time.monotonic()
+            try:
+                client = metrics.get_redis()
+                lock = client.lock(lock_name, timeout=ttl, blocking_timeout=wait, thread_local=False)
+                acquired = lock.acquire(blocking=wait > 0)
+            except redis.RedisError as e:
+                logger.info(f'single_flight: {name} running unlocked: {e.__class__.__name__}')
+                return func(*args, **kwargs)
+            metrics.observe('monitor_task_lock_wait_seconds', labels, time.monotonic() - started_at)
+
+            if not acquired:
+                metrics.inc('monitor_task_lock_skips_total', labels)
+                if coalesce:
+                    client.set(pending_name, 1, ex=int(ttl))
+                return
+
+            stop = threading.Event()
+            threading.Thread(target=_renew, args=(lock, ttl, stop), daemon=True).start()
+            try:
+                result = func(*args, **kwargs)
+                while coalesce and client.getdel(pending_name):
+                    metrics.inc('monitor_task_lock_coalesced_total', labels)
+                    result = func(*args, **kwargs)
+                return result
+            finally:
+                stop.set()
+                try:
+                    lock.release()
+                except (LockError, redis.RedisError):
+                    pass
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,126 @@
+import os
+import time
+
+import redis
+from celery.signals import task_postrun, task_prerun
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db import connection
+
+logger = get_task_logger(__name__)
+
+METRICS_PREFIX = 'metrics'
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+_clients = {}
+
+
+def get_redis() -> redis.Redis:
+    client = _clients.get(os.getpid())
+    if client is None:
+        client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=1)
+        _clients[os.getpid()] = client
+    return client
+
+
+def _labels(labels: dict) -> str:
+    return ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+
+
+def inc(name: str, labels: dict, value: float = 1) -> None:
+    """Add ``value`` to a counter; metrics never break the caller."""
+    try:
+        get_redis().hincrbyfloat(f'{METRICS_PREFIX}:counter:{name}', _labels(labels), value)
+    except redis.RedisError as e:
+        logger.info(f'metrics: {name} {e.__class__.__name__}')
+
+
+def observe(name: str, labels: dict, value: float, buckets: tuple = DURATION_BUCKETS) -> None:
+    """Record ``value`` in a cumulative histogram."""
+    key = f'{METRICS_PREFIX}:histogram:{name}'
+    label_str = _labels(labels)
+    sep = ',' if label_str else ''
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for bucket in buckets:
+            if value <= bucket:
+                pipe.hincrbyfloat(key, f'_bucket|{label_str}{sep}le="{bucket}"', 1)
+        pipe.hincrbyfloat(key, f'_bucket|{label_str}{sep}le="+Inf"', 1)
+        pipe.hincrbyfloat(key, f'_sum|{label_str}', value)
+        pipe.hincrbyfloat(key, f'_count|{label_str}', 1)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.info(f'metrics: {name} {e.__class__.__name__}')
+
+
+def _sample(name: str, label_str: str, value) -> str:
+    value = float(value)
+    value = int(value) if value.is_integer() else value
+    return f'{name}{{{label_str}}} {value}' if label_str else f'{name} {value}'
+
+
+def render(gauges: dict = None) -> str:
+    """
+    Render every stored metric in the Prometheus text format.
+
+    ``gauges`` maps a metric name to ``{labels: value}`` for values that
+    are read at scrape time rather than stored.
+    """
+    client = get_redis()
+    lines = []
+    for key in sorted(client.scan_iter(f'{METRICS_PREFIX}:*')):
+        _, kind, name = key.decode().split(':', 2)
+        fields = client.hgetall(key)
+        lines.append(f'# TYPE {name} {kind}')
+        for field, value in sorted(fields.items()):
+            field = field.decode()
+            if kind == 'histogram':
+                suffix, label_str = field.split('|', 1)
+                lines.append(_sample(name + suffix, label_str, value))
+            else:
+                lines.append(_sample(name, field, value))
+
+    for name, samples in (gauges or {}).items():
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in samples.items():
+            lines.append(_sample(name, _labels(dict(labels)), value))
+    return '\n'.join(lines) + '\n'
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+_running = {}
+
+
+@task_prerun.connect
+def on_task_prerun(task_id=None, task=None, **kwargs):
+    counter = QueryCounter()
+    connection.execute_wrappers.append(counter)
+    _running[task_id] = (time.monotonic(), counter)
+
+
+@task_postrun.connect
+def on_task_postrun(task_id=None, task=None, retval=None, state=None, **kwargs):
+    started = _running.pop(task_id, None)
+    if started is None:
+        return
+    started_at, counter = started
+    if counter in connection.execute_wrappers:
+        connection.execute_wrappers.remove(counter)
+
+    labels = {'task': task.name}
+    observe('monitor_task_duration_seconds', labels, time.monotonic() - started_at)
+    inc('monitor_task_runs_total', {**labels, 'state': state or 'UNKNOWN'})
+    inc('monitor_task_db_queries_total', labels, counter.count)
+    if isinstance(retval, int) and not isinstance(retval, bool):
+        observe('monitor_task_items', labels, retval, buckets=COUNT_BUCKETS)
+        inc('monitor_task_items_total', labels, retval)
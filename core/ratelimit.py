@@ -0,0 +1,135 @@
+import threading
+import time
+
+import redis
+
+from core import metrics
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    ``rate`` tokens are added per second up to ``capacity``; ``acquire``
+    blocks until a token is available, so every thread sharing a bucket
+    shares the same budget.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated_at) * self.rate,
+        )
+        self.updated_at = now
+
+    def wait_time(self) -> float:
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def try_acquire(self) -> bool:
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# GCRA over a "theoretical arrival time" key: every call that takes a
+# token pushes it one interval further, and the wait is how far it runs
+# ahead of the burst allowance. Redis' clock keeps hosts consistent.
+SHARED_BUCKET_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local mode = ARGV[3]
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local wait = math.max(0, tat + interval - burst - now)
+if mode == 'acquire' or (mode == 'try' and wait == 0) then
+    local ttl = math.ceil((tat + interval - now) * 1000) + 1000
+    redis.call('SET', KEYS[1], tostring(tat + interval), 'PX', ttl)
+end
+return tostring(wait)
+"""
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    Token bucket kept in Redis under ``ratelimit:<name>``.
+
+    Every process and thread using the same name shares one budget, so
+    prefork concurrency does not multiply the rate. If Redis is
+    unavailable the bucket falls back to a per-process one.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float = 1):
+        super().__init__(rate, capacity)
+        self.key = f'ratelimit:{name}'
+        self.throttle = None
+
+    def limit(self, rate: float) -> None:
+        """
+        Cap this process below its share of the budget, e.g. for a backfill.
+
+        The shared rate is left alone, so a higher ``rate`` has no effect.
+        """
+        self.throttle = TokenBucket(min(rate, self.rate))
+
+    def _shared(self, mode: str) -> [float, None]:
+        try:
+            client = metrics.get_redis()
+            wait = client.register_script(SHARED_BUCKET_SCRIPT)(
+                keys=[self.key],
+                args=[1 / self.rate, self.capacity / self.rate, mode],
+            )
+        except redis.RedisError:
+            return
+        return float(wait)
+
+    def wait_time(self) -> float:
+        wait = self._shared('peek')
+        wait = super().wait_time() if wait is None else wait
+        if self.throttle is not None:
+            wait = max(wait, self.throttle.wait_time())
+        return wait
+
+    def try_acquire(self) -> bool:
+        if self.throttle is not None and not self.throttle.try_acquire():
+            return False
+        wait = self._shared('try')
+        return super().try_acquire() if wait is None else wait == 0
+
+    def acquire(self) -> None:
+        if self.throttle is not None:
+            self.throttle.acquire()
+        # the token is reserved right away, the wait is the caller's turn
+        wait = self._shared('acquire')
+        if wait is None:
+            super().acquire()
+        elif wait:
+            time.sleep(wait)
@@ -133,8 +133,60 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = "iam.CustomUser"
 
-CELERY_BROKER_URL = 'redis://redis:6379'
+REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379')
+
+# A separate, size-bounded redis: LRU eviction must never touch the broker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_REDIS_URL', 'redis://redis-cache:6379'),
+    }
+}
+
+CELERY_BROKER_URL = REDIS_URL
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_TIMEZONE = TIME_ZONE
 
+# Alerts must not wait behind balance refreshes: each queue has its own
+# worker (see docker-compose.yaml), unrouted tasks land on refresh.
+CELERY_TASK_DEFAULT_QUEUE = 'refresh'
+CELERY_TASK_ROUTES = {
+    'monitor.tasks.get_latest_transfers': {'queue': 'ingest'},
+    'monitor.tasks.get_latest_dapp_staking': {'queue': 'ingest'},
+    'monitor.tasks.get_latest_ton_transfers': {'queue': 'ingest'},
+    'monitor.tasks.get_ton_account_transfers': {'queue': 'ingest'},
+    'monitor.tasks.check_new_dapps': {'queue': 'ingest'},
+    'monitor.tasks.deliver_messages': {'queue': 'notify'},
+    'monitor.tasks.flush_digest_events': {'queue': 'notify'},
+    'monitor.tasks.get_account_balances': {'queue': 'refresh'},
+    'monitor.tasks.get_top_holders': {'queue': 'refresh'},
+    'monitor.tasks.archive_old_transfers': {'queue': 'refresh'},
+    'monitor.tasks.prune_outbox': {'queue': 'refresh'},
+    'monitor.tasks.import_ton_watchlist': {'queue': 'refresh'},
+}
+# one task reserved per process, so a long refresh never holds back
+# ticks another process could run; acked after it finishes
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    # ingestion triggers delivery itself, this only picks up retries
+    'deliver-messages': {
+        'task': 'monitor.tasks.deliver_messages',
+        'schedule': 15.0,
+    },
+    'flush-digest-events': {
+        'task': 'monitor.tasks.flush_digest_events',
+        'schedule': 30.0,
+    },
+    'archive-old-transfers': {
+        'task': 'monitor.tasks.archive_old_transfers',
+        'schedule': 24 * 60 * 60.0,
+    },
+    'prune-outbox': {
+        'task': 'monitor.tasks.prune_outbox',
+        'schedule': 24 * 60 * 60.0,
+    },
+}
@@ -3,16 +3,157 @@ import os
 import requests
 from celery.utils.log import get_task_logger
 
+from core.cache import CachedResponse, cached_json
+from core.http import get_session, request
+from core.ratelimit import SharedTokenBucket
+
 logger = get_task_logger(__name__)
 
 SUBSCAN_API_KEY = os.getenv('SUBSCAN_API_KEY')
-SUBSCAN_API_V2_URL = 'https://astar.api.subscan.io/api/v2/scan/'
+SUBSCAN_API_V2_URL = os.getenv('SUBSCAN_API_V2_URL', 'https://astar.api.subscan.io/api/v2/scan/')
+SUBSCAN_MAX_PAGES = int(os.getenv('SUBSCAN_MAX_PAGES', 10))
+SUBSCAN_API_RPS = float(os.getenv('SUBSCAN_API_RPS', 5))
+# Subscan stops paging after 10000 rows of a query
+SUBSCAN_RANGE_MAX_PAGES = 100
+# block ranges read per tick when the cursor is further back than
+# SUBSCAN_MAX_PAGES, e.g. after an outage
+SUBSCAN_GAP_BLOCKS = int(os.getenv('SUBSCAN_GAP_BLOCKS', 1000))
+SUBSCAN_GAP_CHUNKS = int(os.getenv('SUBSCAN_GAP_CHUNKS', 10))
 
+subscan_bucket = SharedTokenBucket('subscan', rate=SUBSCAN_API_RPS)
 
-def make_request(resource: str, data: dict) -> [dict, None]:
+
+def post(resource: str, data: dict, headers: dict = None) -> [requests.Response, None]:
     url = SUBSCAN_API_V2_URL + resource
-    headers = {"x-api-key": SUBSCAN_API_KEY}
-    response = requests.post(url, headers=headers, json=data)
-    logger.info(f'make_request: {url} {response.status_code}')
-    if response.status_code == 200:
+    headers = {"x-api-key": SUBSCAN_API_KEY, **(headers or {})}
+    subscan_bucket.acquire()
+    response = request(get_session('subscan'), 'POST', url, headers=headers, json=data)
+    if response is not None:
+        logger.info(f'make_request: {url} {response.status_code}')
+    return response
+
+
+def make_request(resource: str, data: dict) -> [dict, None]:
+    response = post(resource, data)
+    if response is not None and response.status_code == 200:
         return response.json()
+
+
+def make_cached_request(resource: str, data: dict, ttl: int) -> [CachedResponse, None]:
+    return cached_json(
+        f'subscan:{resource}',
+        data,
+        ttl,
+        lambda headers: post(resource, data, headers),
+    )
+
+
+def extrinsic_index_key(extrinsic_index: str) -> tuple:
+    block_num, _, index = extrinsic_index.partition('-')
+    return int(block_num), int(index or 0)
+
+
+def fetch_since(
+        resource: str,
+        data: dict,
+        list_key: str,
+        cursor: [str, None],
+) -> [list, None]:
+    """
+    Page through a newest-first Subscan feed until the cursor is reached.
+
+    Returns the rows newer than ``cursor`` (an extrinsic index), oldest
+    first, or None if any page failed so the cursor is not advanced past
+    a gap. Without a cursor only the first page is read. When the cursor
+    lies beyond SUBSCAN_MAX_PAGES, the rows right after it are filled in
+    by block range instead (see fill_gap).
+    """
+    cursor_key = extrinsic_index_key(cursor) if cursor else None
+    rows = []
+    for page in range(SUBSCAN_MAX_PAGES):
+        response = make_request(resource, {**data, 'page': page})
+        if not response:
+            return
+        page_rows = response['data'][list_key] or []
+        if cursor_key is None:
+            rows.extend(page_rows)
+            break
+
+        reached = False
+        for row in page_rows:
+            if extrinsic_index_key(row['extrinsic_index']) <= cursor_key:
+                reached = True
+                break
+            rows.append(row)
+        if reached or len(page_rows) < data['row']:
+            break
+    else:
+        logger.info(f'fetch_since: {resource} cursor {cursor} not reached '
+                    f'after {SUBSCAN_MAX_PAGES} pages')
+        return fill_gap(resource, data, list_key, cursor_key, list(reversed(rows)))
+
+    return list(reversed(rows))
+
+
+def fill_gap(
+        resource: str,
+        data: dict,
+        list_key: str,
+        cursor_key: tuple,
+        newest: list,
+) -> [list, None]:
+    """
+    Fetch the rows between the cursor and ``newest`` (oldest first) by
+    block range, so the cursor never moves past rows that were not read.
+
+    Once rows are found, at most SUBSCAN_GAP_CHUNKS ranges are read per
+    call. If they do not reach ``newest``, only the gap rows read so far
+    are returned and the next call carries on from the cursor they leave
+    behind.
+    """
+    oldest_key = extrinsic_index_key(newest[0]['extrinsic_index'])
+    gap = []
+    start = cursor_key[0]
+    chunks = 0
+    while not gap or chunks < SUBSCAN_GAP_CHUNKS:
+        chunks += 1
+        end = min(start + SUBSCAN_GAP_BLOCKS - 1, oldest_key[0])
+        chunk = fetch_block_range(resource, data, list_key, start, end)
+        if chunk is None:
+            return gap or None
+        gap.extend(
+            row for row in chunk
+            if cursor_key < extrinsic_index_key(row['extrinsic_index']) < oldest_key
+        )
+        if end == oldest_key[0]:
+            return gap + newest
+        start = end + 1
+    logger.info(f'fill_gap: {resource} caught up to block {start - 1}, '
+                f'{oldest_key[0]} still ahead')
+    return gap
+
+
+def fetch_block_range(
+        resource: str,
+        data: dict,
+        list_key: str,
+        start: int,
+        end: int,
+) -> [list, None]:
+    """
+    Read every row of a Subscan feed between two blocks, inclusive.
+
+    Returns the rows oldest first, or None if a page failed or the range
+    holds more rows than Subscan pages through (use a smaller range).
+    """
+    rows = []
+    for page in range(SUBSCAN_RANGE_MAX_PAGES):
+        response = make_request(resource, {**data, 'block_range': f'{start}-{end}', 'page': page})
+        if not response:
+            return
+        page_rows = response['data'][list_key] or []
+        rows.extend(page_rows)
+        if len(page_rows) < data['row']:
+            return list(reversed(rows))
+    logger.info(f'fetch_block_range: {resource} {start}-{end} has more than '
+                f'{SUBSCAN_RANGE_MAX_PAGES} pages')
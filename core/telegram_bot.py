@@ -1,34 +1,48 @@
 import os
+from datetime import timedelta
+from decimal import Decimal
 
 import requests
 from celery.utils.log import get_task_logger
+from django.utils import timezone
 
-from monitor.models import Account, Dapp
+from core.http import connect_failed, get_session, request
+from core.ratelimit import TokenBucket
+from monitor.dapps import DappInfo
+from monitor.models import Account, Dapp, OutboxMessage
 
 logger = get_task_logger(__name__)
 
 TOKEN = os.getenv('TELEGRAM_TOKEN')
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/')
+TELEGRAM_GLOBAL_RPS = float(os.getenv('TELEGRAM_GLOBAL_RPS', 25))
+TELEGRAM_CHAT_INTERVAL = float(os.getenv('TELEGRAM_CHAT_INTERVAL', 3))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+global_bucket = TokenBucket(rate=TELEGRAM_GLOBAL_RPS, capacity=TELEGRAM_GLOBAL_RPS)
+chat_buckets = {}
 
 
 def create_transfer_message(
         from_account: Account,
         to_account: Account,
-        amount: float,
-        usd_amount: float,
+        amount: Decimal,
+        usd_amount: Decimal,
         asset_symbol: str,
 ) -> str:
     sender_rank = from_account.rank
     sender_link = from_account.subscan_link
     sender = (
         f'Sender(Top {sender_rank}): {sender_link}'
-        if sender_rank < 100 else f'Sender: {sender_link}'
+        if sender_rank and sender_rank < 100 else f'Sender: {sender_link}'
     )
 
     receiver_rank = to_account.rank
     receiver_link = to_account.subscan_link
     receiver = (
         f'Receiver(Top {receiver_rank}): {receiver_link}'
-        if receiver_rank < 100 else f'Receiver: {receiver_link}'
+        if receiver_rank and receiver_rank < 100 else f'Receiver: {receiver_link}'
     )
 
     return (
@@ -40,9 +54,9 @@ def create_transfer_message(
 
 def create_extrinsic_message(
         account: Account,
-        dapp: Dapp,
+        dapp: [Dapp, DappInfo],
         action: str,
-        amount: float,
+        amount: Decimal,
         asset_symbol: str,
 ) -> str:
     account_rank = account.rank
@@ -51,7 +65,7 @@ def create_extrinsic_message(
 
     acc = (
         f'Account(Top {account_rank}): {account_link}'
-        if account_rank < 100 else f'Account: {account_link}'
+        if account_rank and account_rank < 100 else f'Account: {account_link}'
     )
 
     return (
@@ -61,22 +75,70 @@ def create_extrinsic_message(
         f'Amount: {amount:,.2f} {asset_symbol}\n')
 
 
+def load_ranks(accounts) -> None:
+    """Refresh holder_rank of every account of a batch in one query."""
+    ranks = Account.get_ranks({account.id for account in accounts})
+    for account in accounts:
+        account.holder_rank = ranks.get(account.id)
+
+
+def create_transfer_messages(transfers: list) -> list:
+    load_ranks(
+        [transfer.from_account for transfer in transfers]
+        + [transfer.to_account for transfer in transfers]
+    )
+    return [
+        create_transfer_message(
+            transfer.from_account,
+            transfer.to_account,
+            transfer.display_amount,
+            transfer.usd_amount,
+            transfer.asset_symbol,
+        )
+        for transfer in transfers
+    ]
+
+
+def create_extrinsic_messages(events: list) -> list:
+    """Render ``(transfer, dapp)`` staking events, ranks loaded in one query."""
+    load_ranks([transfer.from_account for transfer, _ in events])
+    return [
+        create_extrinsic_message(
+            transfer.from_account,
+            dapp,
+            transfer.module,
+            transfer.display_amount,
+            transfer.asset_symbol,
+        )
+        for transfer, dapp in events
+    ]
+
+
+def create_balance_change_message(account: Account, previous: Decimal, balance: Decimal) -> str:
+    change = balance - previous
+    return (
+        f'Holder(Top {account.rank}): {account.subscan_link}\n'
+        f'Balance change: {change:+,.2f} ASTR ({change / previous:+.1%})\n'
+        f'Balance: {balance:,.2f} ASTR\n'
+    )
+
+
 def create_new_dapp_message(dapp: Dapp) -> str:
     return f'New dapp has been added: {dapp.portal_link}\n'
 
 
+def tonviewer_link(address, name) -> str:
+    url = 'https://tonviewer.com/'
+    return f"<a href='{url}{address}'>{name}</a>"
+
+
 def create_ton_transfer_message(
         source_address: str,
         source_name: str,
         destination_address: str,
         destination_name: str,
-        amount: str,
+        amount: Decimal,
     ) -> str:
-
-    def tonviewer_link(address, name) -> str:
-        url = 'https://tonviewer.com/'
-        return f"<a href='{url}{address}'>{name}</a>"
-
     sender = tonviewer_link(source_address, source_name or source_address)
     receiver = tonviewer_link(destination_address, destination_name or destination_address)
     asset_symbol = 'TON'
@@ -87,16 +149,85 @@ def create_ton_transfer_message(
     )
 
 
-def send_message(chat_id: str, message: str) -> None:
+def send_message(chat_id: str, message: str) -> requests.Response:
+    """Post one message; network errors are raised, see deliver_message."""
     logger.info(f'send_message: {message}')
-    url = f'https://api.telegram.org/bot{TOKEN}/sendMessage'
+    url = f'{TELEGRAM_API_URL}bot{TOKEN}/sendMessage'
     data = {
         'chat_id': chat_id,
         'text': message,
         'parse_mode': 'HTML',
     }
 
-    response = requests.post(url, json=data)
+    # sendMessage is not idempotent: only failed connects are retried
+    # here, everything else is left to the outbox (retry_after per chat)
+    session = get_session('telegram', retry_statuses=(), retry_methods=())
+    response = request(session, 'POST', url, raise_errors=True, json=data)
     logger.info(f'send_message: {response.status_code}')
     if response.status_code != 200:
         logger.info(f'send_message: {response.text}')
+    return response
+
+
+def enqueue_messages(chat_id: str, messages: list) -> None:
+    if messages:
+        OutboxMessage.objects.bulk_create(
+            [OutboxMessage(chat_id=chat_id, text=message) for message in messages]
+        )
+
+
+def chat_bucket(chat_id: str) -> TokenBucket:
+    bucket = chat_buckets.get(chat_id)
+    if bucket is None:
+        bucket = TokenBucket(rate=1 / TELEGRAM_CHAT_INTERVAL)
+        chat_buckets[chat_id] = bucket
+    return bucket
+
+
+def deliver_message(message: OutboxMessage) -> None:
+    """
+    Send one outbox message and record the outcome on it.
+
+    429 responses are rescheduled after Telegram's ``retry_after``,
+    failed connects and 5xx back off exponentially, any other error is
+    final. A request lost after it was sent (e.g. a read timeout) may
+    already have been delivered, so it is marked failed for review
+    rather than sent twice.
+    """
+    global_bucket.acquire()
+    try:
+        response = send_message(message.chat_id, message.text)
+        error = None
+    except requests.RequestException as e:
+        response = None
+        error = e
+    now = timezone.now()
+    message.attempts += 1
+
+    if error is not None and not connect_failed(error):
+        message.status = OutboxMessage.FAILED
+        message.error = f'{error.__class__.__name__} after sending, may have been delivered'
+    elif response is not None and response.status_code == 200:
+        message.status = OutboxMessage.SENT
+        message.sent_at = now
+        message.error = ''
+    elif response is not None and response.status_code == 429:
+        # throttling is not the message's fault, so it never exhausts attempts
+        try:
+            retry_after = response.json()['parameters']['retry_after']
+        except (ValueError, KeyError, TypeError):
+            retry_after = TELEGRAM_CHAT_INTERVAL
+        message.attempts -= 1
+        message.error = response.text[:255]
+        message.next_attempt_at = now + timedelta(seconds=retry_after)
+    else:
+        message.error = response.text[:255] if response is not None else 'connect failed'
+        retryable = response is None or response.status_code >= 500
+        if retryable and message.attempts < OUTBOX_MAX_ATTEMPTS:
+            message.next_attempt_at = now + timedelta(seconds=2 ** message.attempts)
+        else:
+            message.status = OutboxMessage.FAILED
+
+    message.save(update_fields=[
+        'status', 'attempts', 'next_attempt_at', 'sent_at', 'error', 'updated_at',
+    ])
@@ -1,18 +1,84 @@
 import os
 
-import requests
 from celery.utils.log import get_task_logger
 
+from core.http import get_session, request
+from core.ratelimit import SharedTokenBucket
+
 logger = get_task_logger(__name__)
 
 TON_API_KEY = os.getenv('TON_API_KEY')
-TON_API_URL = 'https://tonapi.io/v2/'
+TON_API_URL = os.getenv('TON_API_URL', 'https://tonapi.io/v2/')
+TON_API_RPS = float(os.getenv('TON_API_RPS', 1))
+TON_PAGE_LIMIT = 100
+TON_MAX_PAGES = int(os.getenv('TON_MAX_PAGES', 10))
+
+tonapi_bucket = SharedTokenBucket('tonapi', rate=TON_API_RPS)
 
 
-def make_tonapi_request(resource: str) -> [dict, None]:
+def make_tonapi_request(resource: str, params: dict = None) -> [dict, None]:
     url = TON_API_URL + resource
     headers = {'Authorization': f'Bearer {TON_API_KEY}'}
-    response = requests.get(url, headers=headers)
+    tonapi_bucket.acquire()
+    response = request(get_session('tonapi'), 'GET', url, headers=headers, params=params)
+    if response is None:
+        return
     logger.info(f'make_tonapi_request: {url} {response.status_code}')
     if response.status_code == 200:
         return response.json()
+
+
+def parse_address(address: str) -> [str, None]:
+    """Raw form (``0:<hex>``) of a user-friendly address, None if unresolved."""
+    response = make_tonapi_request(f'address/{address}/parse')
+    if response:
+        return response.get('raw_form') or None
+
+
+def fetch_account_transactions(address: str, after_lt: [int, None]) -> [list, None]:
+    """
+    Return the transactions of ``address`` newer than ``after_lt``, oldest first.
+
+    Pages forward from the cursor; without one only the latest page is
+    read. None means a page failed and the cursor must not move.
+    """
+    resource = f'blockchain/accounts/{address}/transactions'
+    if after_lt is None:
+        response = make_tonapi_request(resource, {'limit': TON_PAGE_LIMIT})
+        if not response or response.get('transactions') is None:
+            return
+        return list(reversed(response['transactions']))
+
+    transactions = []
+    for _ in range(TON_MAX_PAGES):
+        params = {
+            'after_lt': after_lt,
+            'limit': TON_PAGE_LIMIT,
+            'sort_order': 'asc',
+        }
+        response = make_tonapi_request(resource, params)
+        if not response or response.get('transactions') is None:
+            return
+        page = response['transactions']
+        transactions.extend(page)
+        if len(page) < TON_PAGE_LIMIT:
+            break
+        after_lt = page[-1]['lt']
+    else:
+        logger.info(f'fetch_account_transactions: {address} has more than '
+                    f'{TON_MAX_PAGES} pages of new transactions')
+    return transactions
+
+
+def fetch_transactions_before(address: str, before_lt: [int, None]) -> [list, None]:
+    """
+    Return one page of ``address`` transactions older than ``before_lt``
+    (the latest ones without it), newest first. None means the page failed.
+    """
+    params = {'limit': TON_PAGE_LIMIT, 'sort_order': 'desc'}
+    if before_lt is not None:
+        params['before_lt'] = before_lt
+    response = make_tonapi_request(f'blockchain/accounts/{address}/transactions', params)
+    if not response or response.get('transactions') is None:
+        return
+    return response['transactions']
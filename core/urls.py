@@ -17,7 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from monitor.views import balance_history_view, metrics_view, volume_view
+
 urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
+    path('api/volume', volume_view, name='volume'),
+    path('api/balance-history', balance_history_view, name='balance-history'),
     path('', admin.site.urls),
 ]
 
@@ -1,16 +1,65 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.functional import cached_property
 
 from monitor import models as monitor_models
+from monitor.tasks import import_ton_watchlist
+from monitor.watchlist import (import_report_key, read_watchlist,
+                               resolve_addresses)
+
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the row count of large unfiltered tables from
+    pg_class.reltuples instead of running COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(monitor_models.Account)
-class AccountAdmin(admin.ModelAdmin):
+class AccountAdmin(LargeTableAdmin):
+    list_display = ('address', 'name', 'display', 'balance', 'holder_rank')
     readonly_fields = (
         'display',
         'balance',
         'balance_lock',
+        'holder_rank',
     )
     search_fields = ['address']
+    search_help_text = 'Address prefix'
+
+    def get_search_results(self, request, queryset, search_term):
+        # case-sensitive prefix match, served by account_address_prefix_idx
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(address__startswith=search_term), False
 
 
 @admin.register(monitor_models.Dapp)
@@ -22,7 +71,17 @@ class DappAdmin(admin.ModelAdmin):
 
 
 @admin.register(monitor_models.Transfer)
-class TransferAdmin(admin.ModelAdmin):
+class TransferAdmin(LargeTableAdmin):
+    list_display = (
+        'extrinsic_index',
+        'from_account',
+        'to_account',
+        'display_amount',
+        'asset_symbol',
+        'module',
+        'created_at',
+    )
+    list_select_related = ('from_account', 'to_account')
     readonly_fields = (
         'extrinsic_index',
         'from_account',
@@ -30,12 +89,124 @@ class TransferAdmin(admin.ModelAdmin):
         'asset_symbol',
         'module',
         'amount',
+        'decimals',
+        'display_amount',
     )
 
 
+class WatchlistImportForm(forms.Form):
+    file = forms.FileField(help_text='CSV with address and name columns, or a JSON list')
+
+
 @admin.register(monitor_models.TONAccount)
 class TONAccountAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/monitor/tonaccount/change_list.html'
+    list_display = ('name', 'address', 'address_raw')
     readonly_fields = (
         'address_raw',
     )
     search_fields = ['address']
+    actions = ['resolve_raw_addresses']
+
+    def get_urls(self):
+        return [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_view),
+                name='monitor_tonaccount_import',
+            ),
+            path(
+                'import/<str:task_id>/',
+                self.admin_site.admin_view(self.import_report_view),
+                name='monitor_tonaccount_import_report',
+            ),
+        ] + super().get_urls()
+
+    def import_context(self, request, **kwargs) -> dict:
+        return {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import TON watchlist',
+            **kwargs,
+        }
+
+    def import_view(self, request):
+        form = WatchlistImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            fmt = 'json' if upload.name.lower().endswith('.json') else 'csv'
+            try:
+                entries = read_watchlist(upload.read().decode(), fmt)
+            except (UnicodeDecodeError, ValueError) as e:
+                form.add_error('file', str(e))
+            else:
+                # resolving runs at the TonAPI rate, far longer than a request may take
+                task = import_ton_watchlist.delay(entries)
+                return redirect('admin:monitor_tonaccount_import_report', task_id=task.id)
+        return TemplateResponse(
+            request,
+            'admin/monitor/tonaccount/import.html',
+            self.import_context(request, form=form),
+        )
+
+    def import_report_view(self, request, task_id):
+        return TemplateResponse(
+            request,
+            'admin/monitor/tonaccount/import.html',
+            self.import_context(request, report=cache.get(import_report_key(task_id))),
+        )
+
+    @admin.action(description='Resolve missing raw addresses')
+    def resolve_raw_addresses(self, request, queryset):
+        accounts = list(queryset.filter(address_raw=''))
+        raw_forms = resolve_addresses([account.address for account in accounts])
+        resolved = []
+        for account in accounts:
+            if raw_forms[account.address]:
+                account.address_raw = raw_forms[account.address]
+                resolved.append(account)
+        monitor_models.TONAccount.objects.bulk_update(resolved, ['address_raw'])
+        self.message_user(request, f'{len(resolved)} of {len(accounts)} resolved')
+        unresolved = [account.address for account in accounts if not account.address_raw]
+        if unresolved:
+            self.message_user(
+                request,
+                f'Unresolved: {", ".join(unresolved)}',
+                messages.WARNING,
+            )
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not obj.address_raw:
+            self.message_user(
+                request,
+                f'{obj.address} could not be resolved and will not be polled',
+                messages.WARNING,
+            )
+
+
+@admin.register(monitor_models.TONTransfer)
+class TONTransferAdmin(LargeTableAdmin):
+    list_display = ('hash', 'source_address', 'destination_address', 'display_amount', 'created_at')
+    readonly_fields = (
+        'hash',
+        'source_address',
+        'destination_address',
+        'amount',
+        'display_amount',
+    )
+
+
+@admin.register(monitor_models.FeedCursor)
+class FeedCursorAdmin(admin.ModelAdmin):
+    list_display = ('name', 'value', 'updated_at')
+
+
+@admin.register(monitor_models.OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('chat_id', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    readonly_fields = (
+        'sent_at',
+        'error',
+    )
@@ -0,0 +1,183 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from core.amounts import ASSET_DECIMALS, to_base_units
+from monitor.models import TONTransfer, Transfer
+
+logger = get_task_logger(__name__)
+
+ARCHIVE_DIR = Path(os.getenv('ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+ARCHIVE_RETENTION_DAYS = int(os.getenv('ARCHIVE_RETENTION_DAYS', 90))
+ARCHIVE_BATCH_SIZE = 10000
+
+ARCHIVED_MODELS = {
+    'transfer': Transfer,
+    'ton_transfer': TONTransfer,
+}
+ARCHIVE_UNITS = 'base'
+
+
+def archive_path(table: str, month: str) -> Path:
+    return ARCHIVE_DIR / table / f'{month}.json.gz'
+
+
+def restored_path(table: str, month: str) -> Path:
+    return ARCHIVE_DIR / table / f'{month}.restored'
+
+
+def archive_cutoff(retention_days: int = ARCHIVE_RETENTION_DAYS) -> datetime:
+    """
+    Start of the first month kept in the database; older ones are archived.
+
+    Backfills start here: archived rows are no longer in the database for
+    ingest to recognise, so they would be inserted again.
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    return cutoff.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def upgrade_columns(table: str, columns: dict) -> dict:
+    """Convert a month archived before amounts were stored in base units."""
+    if table == 'transfer':
+        columns['decimals'] = [ASSET_DECIMALS['ASTR']] * len(columns['amount'])
+        decimals = columns['decimals']
+    else:
+        decimals = [ASSET_DECIMALS['TON']] * len(columns['amount'])
+    columns['amount'] = [
+        str(to_base_units(str(amount), places))
+        for amount, places in zip(columns['amount'], decimals)
+    ]
+    return columns
+
+
+def read_archive(table: str, month: str) -> dict:
+    """
+    Load one archived month as ``{column: [values]}``.
+
+    Values are kept as their JSON representation (decimals and datetimes
+    as strings); ``restore_month`` converts them back.
+    """
+    path = archive_path(table, month)
+    if not path.exists():
+        return {}
+    with gzip.open(path, 'rt') as f:
+        archive = json.load(f)
+    if archive.get('units') != ARCHIVE_UNITS:
+        return upgrade_columns(table, archive['columns'])
+    return archive['columns']
+
+
+def write_archive(table: str, month: str, columns: dict) -> None:
+    path = archive_path(table, month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    with gzip.open(tmp, 'wt', compresslevel=9) as f:
+        json.dump(
+            {'table': table, 'month': month, 'units': ARCHIVE_UNITS, 'columns': columns},
+            f,
+            default=str,
+        )
+    os.replace(tmp, path)
+
+
+def list_archives(table: str) -> list:
+    return sorted(path.name.split('.')[0] for path in (ARCHIVE_DIR / table).glob('*.json.gz'))
+
+
+def archive_month(table: str, month_start: datetime) -> int:
+    """
+    Move every row of ``table`` created in the given month to its archive.
+
+    Rows are stored column by column; an existing archive of the month is
+    merged, so re-running after a partial failure or a restore is safe.
+    The file is written before any row is deleted. A restored month is
+    left to archive_expired again once it is archived here.
+    """
+    model = ARCHIVED_MODELS[table]
+    month = f'{month_start:%Y-%m}'
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    names = [field.attname for field in model._meta.concrete_fields]
+
+    rows = model.objects.filter(
+        created_at__gte=month_start,
+        created_at__lt=month_end,
+    ).order_by('id')
+    columns = read_archive(table, month) or {name: [] for name in names}
+    archived_ids = set(columns['id'])
+    ids = []
+    for row in rows.values_list(*names).iterator(chunk_size=ARCHIVE_BATCH_SIZE):
+        ids.append(row[0])
+        if row[0] in archived_ids:
+            continue
+        for name, value in zip(names, row):
+            columns[name].append(value)
+    if not ids:
+        restored_path(table, month).unlink(missing_ok=True)
+        return 0
+
+    write_archive(table, month, columns)
+    for i in range(0, len(ids), ARCHIVE_BATCH_SIZE):
+        model.objects.filter(id__in=ids[i:i + ARCHIVE_BATCH_SIZE]).delete()
+    restored_path(table, month).unlink(missing_ok=True)
+    logger.info(f'archive_month: {table} {month} {len(ids)} rows archived')
+    return len(ids)
+
+
+def archive_expired(retention_days: int = ARCHIVE_RETENTION_DAYS) -> int:
+    """
+    Archive every whole month that ended before the retention window.
+
+    Restored months stay in the database until archived on request.
+    """
+    cutoff_month = archive_cutoff(retention_days)
+    archived = 0
+    for table, model in ARCHIVED_MODELS.items():
+        months = (
+            model.objects.filter(created_at__lt=cutoff_month)
+            .annotate(month=TruncMonth('created_at'))
+            .values_list('month', flat=True)
+            .distinct()
+        )
+        for month_start in sorted(months):
+            if restored_path(table, f'{month_start:%Y-%m}').exists():
+                continue
+            archived += archive_month(table, month_start)
+    return archived
+
+
+def restore_month(table: str, month: str) -> int:
+    """
+    Re-insert an archived month; rows already present are skipped.
+
+    The month is marked restored so archive_expired leaves it alone.
+    """
+    model = ARCHIVED_MODELS[table]
+    columns = read_archive(table, month)
+    if not columns:
+        return 0
+
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    objects = [
+        model(**{
+            name: fields[name].to_python(value)
+            for name, value in zip(columns, values)
+        })
+        for values in zip(*columns.values())
+    ]
+    restored_path(table, month).touch()
+    with transaction.atomic():
+        model.objects.bulk_create(objects, batch_size=ARCHIVE_BATCH_SIZE, ignore_conflicts=True)
+    return len(objects)
+
+
+def list_restored(table: str) -> list:
+    return sorted(path.name.split('.')[0] for path in (ARCHIVE_DIR / table).glob('*.restored'))
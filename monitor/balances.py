@@ -0,0 +1,95 @@
+import os
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import DateTimeField, DurationField, F, Func, Value
+from django.utils import timezone
+
+from monitor.models import Account, BalanceSnapshot
+
+BALANCE_ALERT_RATIO = Decimal(os.getenv('BALANCE_ALERT_RATIO', '0.1'))
+BALANCE_ALERT_WINDOW = timedelta(seconds=int(os.getenv('BALANCE_ALERT_WINDOW', 3600)))
+BALANCE_ALERT_TOP = int(os.getenv('BALANCE_ALERT_TOP', 100))
+SNAPSHOT_BATCH_SIZE = 1000
+
+
+def record_balances(changes: dict) -> None:
+    """Append ``{account_id: (balance, balance_lock)}`` in one bulk insert."""
+    now = timezone.now()
+    BalanceSnapshot.objects.bulk_create(
+        [
+            BalanceSnapshot(
+                account_id=account_id,
+                balance=balance,
+                balance_lock=balance_lock,
+                created_at=now,
+            )
+            for account_id, (balance, balance_lock) in changes.items()
+        ],
+        batch_size=SNAPSHOT_BATCH_SIZE,
+    )
+
+
+def balance_moves(account_ids) -> list:
+    """
+    ``(account, balance before, balance now)`` of every top holder among
+    ``account_ids`` whose balance moved more than BALANCE_ALERT_RATIO
+    within BALANCE_ALERT_WINDOW.
+
+    Call it after refresh_ranks. An account is reported once per window.
+    """
+    accounts = list(
+        Account.objects.filter(id__in=list(account_ids), holder_rank__lte=BALANCE_ALERT_TOP)
+    )
+    if not accounts:
+        return []
+
+    before = BalanceSnapshot.balances_at(
+        [account.id for account in accounts],
+        timezone.now() - BALANCE_ALERT_WINDOW,
+    )
+    moves = []
+    for account in accounts:
+        previous = before.get(account.id)
+        if not previous or abs(account.balance - previous) <= previous * BALANCE_ALERT_RATIO:
+            continue
+        if not cache.add(f'balance-alert:{account.id}', 1, int(BALANCE_ALERT_WINDOW.total_seconds())):
+            continue
+        moves.append((account, previous, account.balance))
+    return moves
+
+
+def balance_history(account: Account, since: datetime, until: datetime, step: timedelta) -> list:
+    """
+    ``(bucket start, balance, balance_lock)`` for a chart, one point per
+    ``step`` that had a change, each the last value of its bucket. The
+    first point is the balance carried in from before ``since``.
+    """
+    carried = (
+        BalanceSnapshot.objects.filter(account=account, created_at__lte=since)
+        .order_by('-created_at')
+        .values_list('balance', 'balance_lock')
+        .first()
+    )
+    bucket = Func(
+        Value(step, output_field=DurationField()),
+        F('created_at'),
+        Value(since, output_field=DateTimeField()),
+        function='date_bin',
+        output_field=DateTimeField(),
+    )
+    points = list(
+        BalanceSnapshot.objects.filter(
+            account=account,
+            created_at__gt=since,
+            created_at__lte=until,
+        )
+        .annotate(bucket=bucket)
+        .order_by('bucket', '-created_at')
+        .distinct('bucket')
+        .values_list('bucket', 'balance', 'balance_lock')
+    )
+    if carried and not (points and points[0][0] == since):
+        points.insert(0, (since, *carried))
+    return points
@@ -0,0 +1,56 @@
+import time
+from typing import NamedTuple
+
+from django.core.cache import cache
+
+from monitor.models import Dapp
+
+DAPPS_VERSION_KEY = 'dapps:version'
+
+
+class DappInfo(NamedTuple):
+    name: str
+    address: str
+
+    @property
+    def portal_link(self) -> str:
+        return Dapp.make_portal_link(self.address, self.name)
+
+
+_registry = {'version': None, 'dapps': {}}
+
+
+def get_dapp_registry() -> dict:
+    """
+    Return the address -> DappInfo map of this worker.
+
+    It is loaded once per process and reloaded only when check_new_dapps
+    has bumped the shared version key, so staking events never query
+    dapps one by one.
+    """
+    version = cache.get(DAPPS_VERSION_KEY)
+    if version is None:
+        # never bumped, or evicted: seed a fresh version every worker
+        # reloads against once
+        cache.add(DAPPS_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(DAPPS_VERSION_KEY)
+    version = version or 0
+    if _registry['version'] is None or version != _registry['version']:
+        _registry['dapps'] = {
+            address.lower(): DappInfo(name, address)
+            for name, address in Dapp.objects.values_list('name', 'account__address')
+        }
+        _registry['version'] = version
+    return _registry['dapps']
+
+
+def get_dapp(address: str, registry: dict = None) -> DappInfo:
+    if registry is None:
+        registry = get_dapp_registry()
+    dapp = registry.get(address.lower())
+    # unknown contracts still get a portal link, named by their address
+    return dapp or DappInfo(address, address)
+
+
+def invalidate_dapp_registry() -> None:
+    cache.set(DAPPS_VERSION_KEY, time.time_ns(), None)
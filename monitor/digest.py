@@ -0,0 +1,129 @@
+import os
+from collections import OrderedDict
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from core.amounts import from_base_units, whole_units
+from core.telegram_bot import TELEGRAM_MESSAGE_LIMIT, enqueue_messages
+from monitor.models import DigestEvent
+
+DIGEST_CHAT_IDS = set(filter(None, os.getenv('TELEGRAM_DIGEST_CHAT_IDS', '').split(',')))
+DIGEST_WINDOW = int(os.getenv('DIGEST_WINDOW', 300))
+DIGEST_MAX_EVENTS = int(os.getenv('DIGEST_MAX_EVENTS', 20))
+URGENT_LIMITS = {
+    'ASTR': int(os.getenv('ASTAR_DIGEST_URGENT_LIMIT', 10000000)),
+    'TON': int(os.getenv('TON_DIGEST_URGENT_LIMIT', 100000)),
+}
+
+
+class Alert(NamedTuple):
+    text: str
+    group: str = ''
+    # base units, see core.amounts
+    amount: int = None
+    asset_symbol: str = ''
+    decimals: int = 0
+
+    @property
+    def urgent(self) -> bool:
+        limit = URGENT_LIMITS.get(self.asset_symbol)
+        return (
+            self.amount is None
+            or limit is None
+            or self.amount >= whole_units(limit, self.decimals)
+        )
+
+
+def route_alerts(chat_id: str, alerts: list) -> list:
+    """
+    Split alerts into texts to send now and events to buffer.
+
+    Chats outside TELEGRAM_DIGEST_CHAT_IDS get every alert immediately.
+    In digest chats only urgent alerts, or ones without an amount, skip
+    the buffer.
+    """
+    if chat_id not in DIGEST_CHAT_IDS:
+        return [alert.text for alert in alerts]
+
+    immediate = []
+    buffered = []
+    for alert in alerts:
+        if alert.urgent:
+            immediate.append(alert.text)
+        else:
+            buffered.append(DigestEvent(
+                chat_id=chat_id,
+                group=alert.group,
+                amount=alert.amount,
+                decimals=alert.decimals,
+                asset_symbol=alert.asset_symbol,
+            ))
+    DigestEvent.objects.bulk_create(buffered)
+    return immediate
+
+
+def render_digest(events: list) -> list:
+    """
+    Render buffered events as one or more messages.
+
+    Lines are packed into messages of at most TELEGRAM_MESSAGE_LIMIT
+    characters (markup included, which Telegram does not count), so a
+    large burst never becomes a message Telegram rejects.
+    """
+    groups = OrderedDict()
+    for event in events:
+        key = (event.group, event.asset_symbol, event.decimals)
+        count, total = groups.get(key, (0, 0))
+        groups[key] = (count + 1, total + int(event.amount))
+
+    started_at = min(event.created_at for event in events)
+    header = f'Digest: {len(events)} events since {started_at:%H:%M} UTC\n'
+    messages = []
+    message = header
+    for (group, asset_symbol, decimals), (count, total) in groups.items():
+        line = f'{group}: {count}x, {from_base_units(total, decimals):,.2f} {asset_symbol}\n'
+        if len(message) + len(line) > TELEGRAM_MESSAGE_LIMIT:
+            messages.append(message)
+            message = 'Digest (continued)\n'
+        message += line
+    messages.append(message)
+    return messages
+
+
+def flush_digests(force: bool = False) -> int:
+    """
+    Turn buffered events into one outbox message per due chat.
+
+    A chat is due once its oldest event is DIGEST_WINDOW seconds old or
+    it holds DIGEST_MAX_EVENTS events. Rows are locked while flushing so
+    concurrent flushes never send the same event twice.
+    """
+    cutoff = timezone.now() - timedelta(seconds=DIGEST_WINDOW)
+    chats = (
+        DigestEvent.objects.values('chat_id')
+        .annotate(events=Count('id'), oldest=Min('created_at'))
+    )
+    flushed = 0
+    for chat in chats:
+        if not (
+            force
+            or chat['events'] >= DIGEST_MAX_EVENTS
+            or chat['oldest'] <= cutoff
+        ):
+            continue
+        with transaction.atomic():
+            events = list(
+                DigestEvent.objects.select_for_update(skip_locked=True)
+                .filter(chat_id=chat['chat_id'])
+                .order_by('id')
+            )
+            if not events:
+                continue
+            enqueue_messages(chat['chat_id'], render_digest(events))
+            DigestEvent.objects.filter(id__in=[event.id for event in events]).delete()
+        flushed += 1
+    return flushed
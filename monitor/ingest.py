@@ -0,0 +1,335 @@
+import json
+import os
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.amounts import (ASSET_DECIMALS, DEFAULT_DECIMALS, to_base_units,
+                          whole_units)
+from monitor.models import Account, TONTransfer, Transfer, VolumeRollup
+from monitor.rollups import staking_deltas, ton_deltas, transfer_deltas
+
+ASTAR_TRANSFER_LOWER_LIMIT = int(os.getenv('ASTAR_TRANSFER_LOWER_LIMIT', 1000000))
+TON_TRANSFER_LOWER_LIMIT = int(os.getenv('TON_TRANSFER_LOWER_LIMIT', 10000))
+STAKING_FUNCTIONS = ('bond_and_stake', 'unbond_and_unstake')
+INSERT_BATCH_SIZE = 1000
+
+# Callers may fetch from a thread pool, but the ingest_* functions are
+# only called from the thread that owns the pool: Django opens a database
+# connection per thread and never closes those of pool threads, so only
+# the HTTP calls run concurrently.
+
+
+def chain_time(timestamp: [int, None]) -> datetime:
+    """Block or transaction time, so backfilled rows keep their real date."""
+    if not timestamp:
+        return timezone.now()
+    return datetime.fromtimestamp(int(timestamp), tz=dt_timezone.utc)
+
+
+def transfer_amount(row: dict) -> tuple:
+    """
+    ``(base units, decimals)`` of a Subscan transfer row.
+
+    The raw ``amount_v2`` is used when the asset's decimals are known,
+    otherwise the decimal ``amount`` string is scaled exactly.
+    """
+    decimals = row.get('decimals', ASSET_DECIMALS.get(row.get('asset_symbol')))
+    if decimals is not None and row.get('amount_v2'):
+        return int(row['amount_v2']), int(decimals)
+    decimals = DEFAULT_DECIMALS if decimals is None else int(decimals)
+    return to_base_units(row.get('amount') or '0', decimals), decimals
+
+
+def parse_transfer(row: dict) -> [dict, None]:
+    if not row.get('success'):
+        return
+    amount, decimals = transfer_amount(row)
+    if amount < whole_units(ASTAR_TRANSFER_LOWER_LIMIT, decimals):
+        return
+
+    return {
+        'extrinsic_index': row.get('extrinsic_index'),
+        'from_address': row.get('from'),
+        'from_display': row.get('from_account_display', {}).get('display', ''),
+        'to_address': row.get('to'),
+        'to_display': row.get('to_address_display', {}).get('display', ''),
+        'asset_symbol': row.get('asset_symbol', ''),
+        'module': row.get('module', ''),
+        'amount': amount,
+        'decimals': decimals,
+        'usd_amount': Decimal(row.get('usd_amount') or '0'),
+        'created_at': chain_time(row.get('block_timestamp')),
+    }
+
+
+def parse_staking(row: dict) -> [dict, None]:
+    call_module_function = row.get('call_module_function')
+    params = row.get('params')
+    if (
+        not row.get('success')
+        or not params
+        or call_module_function not in STAKING_FUNCTIONS
+    ):
+        return
+
+    decimals = ASSET_DECIMALS['ASTR']
+    account_address = None
+    amount = 0
+    dapp_address = None
+    for param in json.loads(params):
+        if param.get('type_name') == 'SmartContract':
+            value = param.get('value')
+            if value:
+                dapp_address = value.get('Evm')
+
+        if param.get('type_name') == 'Balance':
+            amount = int(param.get('value', 0))
+
+            if amount >= whole_units(ASTAR_TRANSFER_LOWER_LIMIT, decimals):
+                account_address = row.get('account_id')
+
+    if not account_address or not dapp_address:
+        return
+
+    return {
+        'extrinsic_index': row.get('extrinsic_index'),
+        'account_address': account_address,
+        'dapp_address': dapp_address,
+        'module': call_module_function,
+        'amount': amount,
+        'decimals': decimals,
+        'created_at': chain_time(row.get('block_timestamp')),
+    }
+
+
+def get_or_create_accounts(displays: dict) -> dict:
+    """
+    Map every address in ``displays`` to its Account in two queries.
+
+    Missing accounts are inserted with their display name; existing
+    ones are left untouched. Addresses are inserted in sorted order, so
+    concurrent ingest transactions lock new rows in the same order
+    instead of deadlocking.
+    """
+    if not displays:
+        return {}
+
+    Account.objects.bulk_create(
+        [
+            Account(address=address, display=displays[address])
+            for address in sorted(displays)
+        ],
+        ignore_conflicts=True,
+    )
+    return Account.objects.in_bulk(list(displays), field_name='address')
+
+
+def insert_new(model, objs: list, unique_field: str) -> list:
+    """
+    Insert ``objs`` skipping conflicts on ``unique_field`` and return the
+    ones actually stored, in order and with their ids set.
+
+    bulk_create(ignore_conflicts=True) cannot tell which rows a concurrent
+    run stored first, and rollups must only count the new ones.
+    """
+    if not objs:
+        return []
+    meta = model._meta
+    fields = [field for field in meta.concrete_fields if not field.primary_key]
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields)
+    unique_column = quote(meta.get_field(unique_field).column)
+    row_placeholder = f'({", ".join(["%s"] * len(fields))})'
+
+    # key order, so concurrent runs lock conflicting rows in the same order
+    ordered = sorted(objs, key=lambda obj: getattr(obj, unique_field))
+    inserted = {}
+    with connection.cursor() as cursor:
+        for i in range(0, len(ordered), INSERT_BATCH_SIZE):
+            batch = ordered[i:i + INSERT_BATCH_SIZE]
+            cursor.execute(
+                f'INSERT INTO {meta.db_table} ({columns}) '
+                f'VALUES {", ".join([row_placeholder] * len(batch))} '
+                f'ON CONFLICT ({unique_column}) DO NOTHING '
+                f'RETURNING {quote(meta.pk.column)}, {unique_column}',
+                [
+                    field.get_db_prep_save(field.pre_save(obj, True), connection)
+                    for obj in batch
+                    for field in fields
+                ],
+            )
+            inserted.update((key, pk) for pk, key in cursor.fetchall())
+
+    stored = []
+    for obj in objs:
+        key = getattr(obj, unique_field)
+        if key in inserted:
+            obj.pk = inserted.pop(key)
+            stored.append(obj)
+    return stored
+
+
+def new_only(parsed: dict) -> dict:
+    existing = set(
+        Transfer.objects.filter(extrinsic_index__in=list(parsed))
+        .values_list('extrinsic_index', flat=True)
+    )
+    return {k: v for k, v in parsed.items() if k not in existing}
+
+
+def ingest_transfers(rows: list) -> list:
+    """
+    Persist a page of Subscan transfers and return the new Transfer rows.
+
+    ``rows`` are expected oldest first. The query count does not depend
+    on the page size.
+    """
+    parsed = {}
+    for row in rows:
+        transfer = parse_transfer(row)
+        if transfer and transfer['extrinsic_index'] not in parsed:
+            parsed[transfer['extrinsic_index']] = transfer
+    if not parsed:
+        return []
+
+    parsed = new_only(parsed)
+    if not parsed:
+        return []
+
+    displays = {}
+    for transfer in parsed.values():
+        displays.setdefault(transfer['from_address'], transfer['from_display'])
+        displays.setdefault(transfer['to_address'], transfer['to_display'])
+    accounts = get_or_create_accounts(displays)
+
+    transfers = [
+        Transfer(
+            extrinsic_index=transfer['extrinsic_index'],
+            from_account=accounts[transfer['from_address']],
+            to_account=accounts[transfer['to_address']],
+            asset_symbol=transfer['asset_symbol'],
+            module=transfer['module'],
+            amount=transfer['amount'],
+            decimals=transfer['decimals'],
+            usd_amount=transfer['usd_amount'],
+            created_at=transfer['created_at'],
+        )
+        for transfer in parsed.values()
+    ]
+    with transaction.atomic():
+        transfers = insert_new(Transfer, transfers, 'extrinsic_index')
+        VolumeRollup.add(transfer_deltas(transfers))
+    return transfers
+
+
+def ingest_staking(rows: list) -> list:
+    """
+    Persist a page of dapp staking extrinsics.
+
+    Returns ``(transfer, dapp_address)`` pairs for the new ones, with the
+    same constant query count as ingest_transfers.
+    """
+    parsed = {}
+    for row in rows:
+        staking = parse_staking(row)
+        if staking and staking['extrinsic_index'] not in parsed:
+            parsed[staking['extrinsic_index']] = staking
+    if not parsed:
+        return []
+
+    parsed = new_only(parsed)
+    if not parsed:
+        return []
+
+    accounts = get_or_create_accounts({
+        staking['account_address']: '' for staking in parsed.values()
+    })
+    events = [
+        (
+            Transfer(
+                extrinsic_index=staking['extrinsic_index'],
+                from_account=accounts[staking['account_address']],
+                to_account=accounts[staking['account_address']],
+                asset_symbol='ASTR',
+                module=staking['module'],
+                amount=staking['amount'],
+                decimals=staking['decimals'],
+                created_at=staking['created_at'],
+            ),
+            staking['dapp_address'],
+        )
+        for staking in parsed.values()
+    ]
+    with transaction.atomic():
+        stored = insert_new(Transfer, [transfer for transfer, _ in events], 'extrinsic_index')
+        events = [(transfer, parsed[transfer.extrinsic_index]['dapp_address']) for transfer in stored]
+        VolumeRollup.add(staking_deltas(events))
+    return events
+
+
+def parse_ton_transaction(transaction: dict) -> [dict, None]:
+    in_msg = transaction.get('in_msg')
+    if in_msg is None:
+        return
+    value = in_msg.get('value')
+    source = in_msg.get('source')
+    destination = in_msg.get('destination')
+    if value is None or source is None or destination is None:
+        return
+
+    amount = int(value)
+    if amount < whole_units(TON_TRANSFER_LOWER_LIMIT, ASSET_DECIMALS['TON']):
+        return
+
+    return {
+        'hash': transaction.get('hash'),
+        'source_address': source.get('address'),
+        'source_name': source.get('name'),
+        'destination_address': destination.get('address'),
+        'destination_name': destination.get('name'),
+        'amount': amount,
+        'created_at': chain_time(transaction.get('utime')),
+    }
+
+
+def ingest_ton_transactions(transactions: list) -> list:
+    """
+    Persist the TON transfers above the limit and return the new ones
+    as parsed dicts, in the order given.
+    """
+    parsed = {}
+    for row in transactions:
+        transfer = parse_ton_transaction(row)
+        if transfer:
+            parsed[transfer['hash']] = transfer
+    if not parsed:
+        return []
+
+    existing = set(
+        TONTransfer.objects.filter(hash__in=list(parsed))
+        .values_list('hash', flat=True)
+    )
+    parsed = [transfer for tx_hash, transfer in parsed.items() if tx_hash not in existing]
+    with transaction.atomic():
+        stored = insert_new(
+            TONTransfer,
+            [
+                TONTransfer(
+                    hash=transfer['hash'],
+                    source_address=transfer['source_address'],
+                    destination_address=transfer['destination_address'],
+                    amount=transfer['amount'],
+                    created_at=transfer['created_at'],
+                )
+                for transfer in parsed
+            ],
+            'hash',
+        )
+        stored = {transfer.hash for transfer in stored}
+        parsed = [transfer for transfer in parsed if transfer['hash'] in stored]
+        VolumeRollup.add(ton_deltas(parsed, ASSET_DECIMALS['TON']))
+    return parsed
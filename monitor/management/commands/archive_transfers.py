@@ -0,0 +1,88 @@
+import csv
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor.archive import (ARCHIVE_RETENTION_DAYS, ARCHIVED_MODELS,
+                             archive_expired, archive_month, list_archives,
+                             list_restored, read_archive, restore_month)
+
+
+def parse_filter(value: str) -> tuple:
+    column, sep, expected = value.partition('=')
+    if not sep:
+        raise ValueError(value)
+    return column, expected
+
+
+class Command(BaseCommand):
+    help = (
+        'Archive transfers older than the retention window, or list, export, '
+        'restore or re-archive archived months'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=ARCHIVE_RETENTION_DAYS)
+        parser.add_argument('--list', action='store_true')
+        parser.add_argument(
+            '--show', nargs=2, metavar=('TABLE', 'MONTH'),
+            help='write the rows of an archived month to stdout as CSV',
+        )
+        parser.add_argument(
+            '--filter', type=parse_filter, action='append', default=[], metavar='COLUMN=VALUE',
+            help='with --show, only rows whose column equals the value; repeatable',
+        )
+        parser.add_argument('--limit', type=int, help='with --show, at most this many rows')
+        parser.add_argument('--restore', nargs=2, metavar=('TABLE', 'MONTH'))
+        parser.add_argument(
+            '--archive', nargs=2, metavar=('TABLE', 'MONTH'),
+            help='archive one month now, e.g. a restored one',
+        )
+
+    def handle(self, *args, **options):
+        for option in ('show', 'restore', 'archive'):
+            if options[option] and options[option][0] not in ARCHIVED_MODELS:
+                raise CommandError(f'table must be one of {", ".join(ARCHIVED_MODELS)}')
+
+        if options['list']:
+            for table in ARCHIVED_MODELS:
+                self.stdout.write(f'{table}: {", ".join(list_archives(table)) or "-"}')
+                restored = list_restored(table)
+                if restored:
+                    self.stdout.write(f'{table} restored: {", ".join(restored)}')
+        elif options['show']:
+            self.show(*options['show'], options['filter'], options['limit'])
+        elif options['restore']:
+            restored = restore_month(*options['restore'])
+            self.stdout.write(f'{restored} rows restored, kept until archived with --archive')
+        elif options['archive']:
+            table, month = options['archive']
+            try:
+                month_start = datetime.strptime(month, '%Y-%m').replace(tzinfo=dt_timezone.utc)
+            except ValueError:
+                raise CommandError('month must look like 2024-01')
+            self.stdout.write(f'{archive_month(table, month_start)} rows archived')
+        else:
+            archived = archive_expired(options['retention_days'])
+            self.stdout.write(f'{archived} rows archived')
+
+    def show(self, table: str, month: str, filters: list, limit: [int, None]) -> None:
+        columns = read_archive(table, month)
+        if not columns:
+            raise CommandError(f'no archive of {table} for {month}')
+        unknown = [column for column, _ in filters if column not in columns]
+        if unknown:
+            raise CommandError(f'unknown columns {", ".join(unknown)}; one of {", ".join(columns)}')
+
+        names = list(columns)
+        positions = [(names.index(column), expected) for column, expected in filters]
+        writer = csv.writer(self.stdout)
+        writer.writerow(names)
+        written = 0
+        for row in zip(*columns.values()):
+            if limit is not None and written >= limit:
+                break
+            if all(str(row[i]) == expected for i, expected in positions):
+                writer.writerow(row)
+                written += 1
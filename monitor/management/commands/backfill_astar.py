@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.subscan import (extrinsic_index_key, fetch_block_range,
+                          subscan_bucket)
+from monitor.archive import archive_cutoff
+from monitor.ingest import chain_time, ingest_staking, ingest_transfers
+from monitor.models import FeedCursor
+from monitor.tasks import (DAPP_STAKING_FEED, SUBSCAN_POOL_WORKERS,
+                           TRANSFERS_FEED)
+
+FEEDS = {
+    TRANSFERS_FEED: ('transfers', {'row': 100}, 'transfers', ingest_transfers),
+    DAPP_STAKING_FEED: ('extrinsics', {'row': 100, 'module': 'dappsstaking'}, 'extrinsics', ingest_staking),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Backfill Astar transfers and dapp staking calls for a block range. '
+        'Chunks are fetched concurrently within the Subscan rate limit and '
+        'progress is checkpointed, so re-running the same range resumes. '
+        'No alerts are sent. Rows older than the archive retention window '
+        'are skipped, they belong to archived months.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from-block', type=int, required=True)
+        parser.add_argument(
+            '--to-block', type=int,
+            help=(
+                'defaults to the live cursor of the feed, resolved on the first run '
+                'from --from-block and reused by later runs so they resume'
+            ),
+        )
+        parser.add_argument('--feeds', nargs='+', default=list(FEEDS), choices=list(FEEDS))
+        parser.add_argument('--chunk-size', type=int, default=5000, help='blocks per request range')
+        parser.add_argument('--workers', type=int, default=SUBSCAN_POOL_WORKERS)
+        parser.add_argument(
+            '--rps', type=float,
+            help='Subscan requests per second for this run, capped by the shared budget',
+        )
+
+    def handle(self, *args, **options):
+        if options['rps']:
+            subscan_bucket.limit(options['rps'])
+        for feed in options['feeds']:
+            to_block = options['to_block']
+            if to_block is None:
+                to_block = self.default_to_block(feed, options['from_block'])
+            self.backfill(feed, options['from_block'], to_block, options)
+
+    def default_to_block(self, feed: str, from_block: int) -> int:
+        # the live cursor moves every tick, so the first resolved value is
+        # stored and keeps naming the same checkpoint on later runs
+        key = f'backfill:{feed}:{from_block}:to'
+        stored = FeedCursor.get_value(key)
+        if stored is not None:
+            return int(stored)
+        cursor = FeedCursor.get_value(feed)
+        if cursor is None:
+            raise CommandError(f'{feed}: no live cursor yet, pass --to-block')
+        to_block = extrinsic_index_key(cursor)[0]
+        FeedCursor.set_value(key, str(to_block))
+        return to_block
+
+    def backfill(self, feed: str, from_block: int, to_block: int, options: dict) -> None:
+        resource, data, list_key, ingest = FEEDS[feed]
+        checkpoint = f'backfill:{feed}:{from_block}-{to_block}'
+        done = FeedCursor.get_value(checkpoint)
+        start = int(done) + 1 if done else from_block
+        if start > to_block:
+            self.stdout.write(f'{feed}: {from_block}-{to_block} already done')
+            return
+
+        size = options['chunk_size']
+        chunks = [(block, min(block + size - 1, to_block)) for block in range(start, to_block + 1, size)]
+        completed = set()
+        failed = []
+        stored = 0
+        skipped = 0
+        cutoff = archive_cutoff()
+        # rows are written from this thread, see monitor.ingest
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {
+                executor.submit(fetch_block_range, resource, data, list_key, *chunk): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                chunk = futures[future]
+                rows = future.result()
+                if rows is None:
+                    failed.append(chunk)
+                    continue
+                kept = [row for row in rows if chain_time(row.get('block_timestamp')) >= cutoff]
+                skipped += len(rows) - len(kept)
+                stored += len(ingest(kept))
+                completed.add(chunk)
+
+                # the checkpoint only moves over a contiguous run of chunks
+                advanced = None
+                for pending in chunks:
+                    if pending not in completed:
+                        break
+                    advanced = pending[1]
+                if advanced is not None and advanced != done:
+                    done = advanced
+                    FeedCursor.set_value(checkpoint, str(done))
+                self.stdout.write(
+                    f'{feed}: {len(completed)}/{len(chunks)} chunks, {stored} rows stored, '
+                    f'{skipped} older than {cutoff:%Y-%m} skipped'
+                )
+
+        if failed:
+            ranges = ', '.join(f'{a}-{b}' for a, b in sorted(failed))
+            raise CommandError(
+                f'{feed}: failed chunks {ranges}; re-run to resume '
+                '(lower --chunk-size for dense ranges)'
+            )
@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.tonapi import (TON_PAGE_LIMIT, fetch_transactions_before,
+                         tonapi_bucket)
+from monitor.archive import archive_cutoff
+from monitor.ingest import ingest_ton_transactions
+from monitor.models import FeedCursor, TONAccount
+from monitor.tasks import TON_POLL_WORKERS
+
+DONE = 'done'
+
+
+def parse_date(value: str) -> datetime:
+    return datetime.fromisoformat(value).replace(tzinfo=dt_timezone.utc)
+
+
+class Command(BaseCommand):
+    help = (
+        'Backfill TON transfers of watched accounts for a time range. '
+        'Accounts are fetched concurrently within the TonAPI rate limit and '
+        'each page is checkpointed, so re-running the same range resumes. '
+        'No alerts are sent. The range starts no earlier than the archive '
+        'retention window, older months are archived.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_date, help='ISO date, defaults to --days ago')
+        parser.add_argument(
+            '--until', type=parse_date,
+            help=(
+                'ISO date, defaults to the time of the first run with the same '
+                '--since/--days, reused by later runs so they resume'
+            ),
+        )
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--accounts', nargs='+', help='raw addresses, defaults to every watched account')
+        parser.add_argument('--workers', type=int, default=TON_POLL_WORKERS)
+        parser.add_argument(
+            '--rps', type=float,
+            help='TonAPI requests per second for this run, capped by the shared budget',
+        )
+
+    def default_until(self, options: dict) -> datetime:
+        # now() moves between runs, so the first one is stored and keeps
+        # naming the same checkpoints until the range is passed explicitly
+        start = options['since'].isoformat() if options['since'] else f'{options["days"]}d'
+        key = f'backfill:ton:{start}:until'
+        stored = FeedCursor.get_value(key)
+        if stored is not None:
+            return datetime.fromtimestamp(int(stored), dt_timezone.utc)
+        until = timezone.now().replace(microsecond=0)
+        FeedCursor.set_value(key, str(int(until.timestamp())))
+        return until
+
+    def handle(self, *args, **options):
+        if options['rps']:
+            tonapi_bucket.limit(options['rps'])
+        until = options['until'] or self.default_until(options)
+        since = options['since'] or until - timedelta(days=options['days'])
+        cutoff = archive_cutoff()
+        if since < cutoff:
+            self.stdout.write(f'--since moved to {cutoff:%Y-%m-%d}, older months are archived')
+            since = cutoff
+        if since >= until:
+            raise CommandError('--since must be before --until')
+        since_utime = int(since.timestamp())
+        until_utime = int(until.timestamp())
+
+        accounts = TONAccount.objects.exclude(address_raw='')
+        if options['accounts']:
+            accounts = accounts.filter(address_raw__in=options['accounts'])
+        checkpoints = {
+            account.address_raw: f'backfill:ton:{since_utime}-{until_utime}:{account.id}'
+            for account in accounts.only('id', 'address_raw')
+        }
+        cursors = dict(
+            FeedCursor.objects.filter(name__in=list(checkpoints.values()))
+            .values_list('name', 'value')
+        )
+
+        stored = 0
+        failed = []
+        # rows are written from this thread, see monitor.ingest; every
+        # finished page queues the next older one of its account
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {}
+
+            def submit(address, before_lt):
+                futures[executor.submit(fetch_transactions_before, address, before_lt)] = address
+
+            for address, checkpoint in checkpoints.items():
+                cursor = cursors.get(checkpoint)
+                if cursor != DONE:
+                    submit(address, int(cursor) if cursor else None)
+
+            while futures:
+                finished, _ = wait(futures, return_when='FIRST_COMPLETED')
+                for future in finished:
+                    address = futures.pop(future)
+                    page = future.result()
+                    if page is None:
+                        failed.append(address)
+                        continue
+
+                    older = [tx for tx in page if tx.get('utime', 0) >= since_utime]
+                    stored += len(ingest_ton_transactions([
+                        tx for tx in reversed(older)
+                        if tx.get('utime', 0) <= until_utime
+                    ]))
+                    if len(older) < len(page) or len(page) < TON_PAGE_LIMIT:
+                        FeedCursor.set_value(checkpoints[address], DONE)
+                        continue
+                    FeedCursor.set_value(checkpoints[address], str(page[-1]['lt']))
+                    submit(address, page[-1]['lt'])
+                self.stdout.write(f'{stored} TON transfers stored, {len(futures)} accounts in flight')
+
+        if failed:
+            raise CommandError(f'failed accounts {", ".join(failed)}; re-run to resume')
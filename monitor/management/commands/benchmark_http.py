@@ -0,0 +1,43 @@
+import statistics
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from core.http import get_session, request
+
+
+class Command(BaseCommand):
+    help = 'Compare poll cycle latency of bare requests calls with the pooled client'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='https://astar.api.subscan.io/api/v2/scan/metadata')
+        parser.add_argument('--method', default='POST')
+        parser.add_argument('--calls-per-cycle', type=int, default=5)
+        parser.add_argument('--cycles', type=int, default=10)
+
+    def handle(self, *args, **options):
+        url = options['url']
+        method = options['method']
+        calls = options['calls_per_cycle']
+        cycles = options['cycles']
+
+        def bare():
+            requests.request(method, url, json={})
+
+        def pooled():
+            request(get_session('benchmark'), method, url, json={})
+
+        for label, call in (('bare', bare), ('pooled', pooled)):
+            timings = []
+            for _ in range(cycles):
+                start = time.perf_counter()
+                for _ in range(calls):
+                    call()
+                timings.append(time.perf_counter() - start)
+            self.stdout.write(
+                f'{label}: cycle mean {statistics.mean(timings) * 1000:.1f} ms, '
+                f'min {min(timings) * 1000:.1f} ms, '
+                f'max {max(timings) * 1000:.1f} ms '
+                f'({calls} calls x {cycles} cycles)'
+            )
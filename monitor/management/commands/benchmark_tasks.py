@@ -0,0 +1,139 @@
+import os
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.http import http_calls
+from monitor import tasks
+from monitor.models import (Account, DigestEvent, FeedCursor, OutboxMessage,
+                            TONAccount, VolumeRollup)
+
+BENCH_PREFIX = 'bench-'
+# the tasks move live cursors, queue alerts, take locks, read stream
+# heartbeats and spend the shared API budget, so they only run against a
+# dedicated database, Redis (locks, rate limits, broker) and cache
+BENCHMARK_DATABASE = os.getenv('BENCHMARK_DATABASE')
+BENCHMARK_REDIS_URL = os.getenv('BENCHMARK_REDIS_URL')
+BENCHMARK_CACHE_URL = os.getenv('BENCHMARK_CACHE_URL')
+BENCH_FEEDS = (tasks.TRANSFERS_FEED, tasks.DAPP_STAKING_FEED)
+DEFAULT_TASKS = (
+    'get_latest_transfers',
+    'get_latest_dapp_staking',
+    'check_new_dapps',
+    'get_top_holders',
+    'get_account_balances',
+    'get_latest_ton_transfers',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed synthetic rows and report wall time, queries and HTTP calls '
+        'per cycle of each monitor task. Run against fake_upstream, with the '
+        'dedicated database, Redis and cache named by BENCHMARK_DATABASE, '
+        'BENCHMARK_REDIS_URL and BENCHMARK_CACHE_URL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--accounts', type=int, default=10000)
+        parser.add_argument('--named', type=int, default=1000)
+        parser.add_argument('--ton-accounts', type=int, default=50)
+        parser.add_argument('--cycles', type=int, default=3)
+        parser.add_argument('--tasks', nargs='+', default=DEFAULT_TASKS, choices=DEFAULT_TASKS)
+        parser.add_argument('--clean', action='store_true', help='drop seeded rows and exit')
+
+    def seed(self, accounts: int, named: int, ton_accounts: int) -> None:
+        existing = Account.objects.filter(address__startswith=BENCH_PREFIX).count()
+        rnd = random.Random(0)
+        batch = []
+        for i in range(existing, accounts):
+            batch.append(Account(
+                address=f'{BENCH_PREFIX}{i}',
+                name=f'Bench {i}' if i < named else '',
+                balance=round(rnd.uniform(0, 10 ** 8), 5),
+            ))
+            if len(batch) == 10000:
+                Account.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        Account.objects.bulk_create(batch, ignore_conflicts=True)
+        Account.refresh_ranks()
+
+        TONAccount.objects.bulk_create(
+            [
+                TONAccount(
+                    name=f'Bench {i}',
+                    address=f'{BENCH_PREFIX}ton-{i}',
+                    address_raw=f'0:{i:064x}',
+                )
+                for i in range(ton_accounts)
+            ],
+            ignore_conflicts=True,
+        )
+        self.stdout.write(
+            f'seeded: {Account.objects.count()} accounts, '
+            f'{TONAccount.objects.count()} TON accounts'
+        )
+
+    def clean(self) -> None:
+        Account.objects.filter(address__startswith=BENCH_PREFIX).delete()
+        TONAccount.objects.filter(address__startswith=BENCH_PREFIX).delete()
+        # left behind by the alerts and rollups of ingested fake rows
+        OutboxMessage.objects.all().delete()
+        DigestEvent.objects.all().delete()
+        VolumeRollup.objects.all().delete()
+
+    def check_isolated(self) -> None:
+        targets = (
+            ('POSTGRES_DB', connection.settings_dict['NAME'], 'BENCHMARK_DATABASE', BENCHMARK_DATABASE),
+            ('REDIS_URL', settings.REDIS_URL, 'BENCHMARK_REDIS_URL', BENCHMARK_REDIS_URL),
+            ('CACHE_REDIS_URL', settings.CACHES['default']['LOCATION'], 'BENCHMARK_CACHE_URL', BENCHMARK_CACHE_URL),
+        )
+        for setting, current, variable, expected in targets:
+            if not expected or current != expected:
+                raise CommandError(
+                    f'refusing to run against {setting}={current!r}: point it at a '
+                    f'dedicated instance and set {variable} to the same value'
+                )
+
+    def handle(self, *args, **options):
+        self.check_isolated()
+        if options['clean']:
+            self.clean()
+            return
+
+        self.seed(options['accounts'], options['named'], options['ton_accounts'])
+        cursors = {name: FeedCursor.get_value(name) for name in BENCH_FEEDS}
+        try:
+            self.run_tasks(options)
+        finally:
+            # every run starts from the same cursors, so runs stay comparable
+            for name, value in cursors.items():
+                if value is None:
+                    FeedCursor.objects.filter(name=name).delete()
+                else:
+                    FeedCursor.set_value(name, value)
+
+    def run_tasks(self, options: dict) -> None:
+        self.stdout.write(f'{"task":<28}{"wall ms":>10}{"queries":>10}{"http":>8}')
+        for name in options['tasks']:
+            task = getattr(tasks, name)
+            timings, queries, calls = [], [], []
+            for _ in range(options['cycles']):
+                calls_before = sum(http_calls.values())
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    task()
+                    timings.append(time.perf_counter() - start)
+                queries.append(len(context))
+                calls.append(sum(http_calls.values()) - calls_before)
+            self.stdout.write(
+                f'{name:<28}'
+                f'{statistics.mean(timings) * 1000:>10.1f}'
+                f'{statistics.mean(queries):>10.1f}'
+                f'{statistics.mean(calls):>8.1f}'
+            )
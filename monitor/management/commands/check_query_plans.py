@@ -0,0 +1,99 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from monitor.models import (Account, BalanceSnapshot, TONTransfer, Transfer,
+                            VolumeRollup)
+
+
+def hot_queries() -> dict:
+    since = timezone.now() - timedelta(days=7)
+    account = Account.objects.order_by('id').values('id', 'address').first() or {'id': 0, 'address': ''}
+    ton_address = TONTransfer.objects.values_list('source_address', flat=True).first() or ''
+    return {
+        'top holders': Account.objects.order_by('-balance')[:100],
+        'named accounts snapshot': (
+            Account.objects.exclude(name='')
+            .values_list('id', 'address', 'balance', 'balance_lock')
+        ),
+        'accounts by address': Account.objects.filter(address__in=[account['address']]),
+        'latest transfers': Transfer.objects.order_by('-created_at')[:100],
+        'transfers from account': Transfer.objects.filter(
+            from_account_id=account['id'], created_at__gte=since,
+        ),
+        'transfers to account': Transfer.objects.filter(
+            to_account_id=account['id'], created_at__gte=since,
+        ),
+        'known extrinsics': Transfer.objects.filter(extrinsic_index__in=['0-0']),
+        'latest TON transfers': TONTransfer.objects.order_by('-created_at')[:100],
+        'TON transfers from address': TONTransfer.objects.filter(
+            source_address=ton_address, created_at__gte=since,
+        ),
+        'TON transfers to address': TONTransfer.objects.filter(
+            destination_address=ton_address, created_at__gte=since,
+        ),
+        'account daily volume': VolumeRollup.objects.filter(
+            dimension=VolumeRollup.ACCOUNT, key=account['address'], asset_symbol='ASTR',
+            period=VolumeRollup.DAY, bucket__gte=since,
+        ).order_by('bucket'),
+        'account balance history': BalanceSnapshot.objects.filter(
+            account_id=account['id'], created_at__gte=since,
+        ),
+    }
+
+
+def explain(queryset) -> dict:
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        result = cursor.fetchone()[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]['Plan']
+
+
+def seq_scans(plan: dict) -> list:
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        found.extend(seq_scans(child))
+    return found
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN the hot queries and fail if any of them plans a sequential '
+        'scan. On a small database pass --no-seqscan, otherwise the planner '
+        'rightly prefers scanning the few rows there are. '
+        'monitor.tests.QueryPlanTests runs the same check.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-analyze', action='store_true', help='skip ANALYZE before planning')
+        parser.add_argument(
+            '--no-seqscan', action='store_true',
+            help='plan with sequential scans disabled, so only queries without a usable index fail',
+        )
+
+    def handle(self, *args, **options):
+        with connection.cursor() as cursor:
+            if not options['no_analyze']:
+                for model in (Account, Transfer, TONTransfer, VolumeRollup, BalanceSnapshot):
+                    cursor.execute(f'ANALYZE {model._meta.db_table}')
+            if options['no_seqscan']:
+                cursor.execute('SET enable_seqscan = off')
+
+        failures = []
+        for name, queryset in hot_queries().items():
+            scans = seq_scans(explain(queryset))
+            status = f'seq scan on {", ".join(scans)}' if scans else 'ok'
+            self.stdout.write(f'{name:<32}{status}')
+            if scans:
+                failures.append(name)
+
+        if failures:
+            raise CommandError(f'sequential scans in: {", ".join(failures)}')
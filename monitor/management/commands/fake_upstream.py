@@ -0,0 +1,305 @@
+import base64
+import hashlib
+import json
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.management.base import BaseCommand
+
+FIRST_BLOCK = 5000000
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+BACKLOG = 1000
+
+
+class FakeUpstream:
+    """
+    Deterministic synthetic chain activity.
+
+    The k-th transfer, staking call or TON transaction is always rendered
+    the same way, and new ones appear at a fixed rate, so pollers see a
+    steady stream of fresh rows on top of a backlog.
+    """
+
+    def __init__(self, options: dict):
+        self.started_at = time.monotonic()
+        self.accounts = options['accounts']
+        self.dapps = options['dapps']
+        self.volume = options['volume']
+        self.ton_volume = options['ton_volume']
+        self.whale_ratio = options['whale_ratio']
+        self.block_time = options['block_time']
+        # one block per row, the backlog ending now
+        self.epoch = int(time.time()) - BACKLOG * 12
+
+    def total(self, volume: float) -> int:
+        return BACKLOG + int((time.monotonic() - self.started_at) * volume)
+
+    def address(self, k: int) -> str:
+        return f'bench-{k % self.accounts}'
+
+    def dapp_address(self, k: int) -> str:
+        return f'0x{k % self.dapps:040x}'
+
+    def amount(self, rnd: random.Random) -> int:
+        if rnd.random() < self.whale_ratio:
+            return rnd.randint(1000000, 50000000)
+        return rnd.randint(1, 999999)
+
+    def page(self, total: int, data: dict) -> range:
+        row = int(data.get('row', 100))
+        page = int(data.get('page', 0))
+        lowest = 0
+        if data.get('block_range'):
+            start, end = (int(block) - FIRST_BLOCK for block in data['block_range'].split('-'))
+            total = min(total, end + 1)
+            lowest = max(start, 0)
+        newest = total - 1 - page * row
+        return range(newest, max(newest - row, lowest - 1), -1)
+
+    def transfer(self, k: int) -> dict:
+        rnd = random.Random(k)
+        amount = self.amount(rnd)
+        return {
+            'extrinsic_index': f'{FIRST_BLOCK + k}-1',
+            'block_num': FIRST_BLOCK + k,
+            'block_timestamp': self.epoch + k * 12,
+            'from': self.address(rnd.randrange(self.accounts)),
+            'to': self.address(rnd.randrange(self.accounts)),
+            'from_account_display': {'display': ''},
+            'to_address_display': {'display': ''},
+            'amount': str(amount),
+            'amount_v2': str(amount * 10 ** 18),
+            'usd_amount': f'{amount * 0.07:.4f}',
+            'asset_symbol': 'ASTR',
+            'module': 'balances',
+            'success': True,
+        }
+
+    def extrinsic(self, k: int) -> dict:
+        rnd = random.Random(-k)
+        params = [
+            {'type_name': 'SmartContract', 'value': {'Evm': self.dapp_address(rnd.randrange(self.dapps))}},
+            {'type_name': 'Balance', 'value': str(self.amount(rnd) * 10 ** 18)},
+        ]
+        return {
+            'extrinsic_index': f'{FIRST_BLOCK + k}-2',
+            'block_num': FIRST_BLOCK + k,
+            'block_timestamp': self.epoch + k * 12,
+            'account_id': self.address(rnd.randrange(self.accounts)),
+            'call_module_function': rnd.choice(('bond_and_stake', 'unbond_and_unstake')),
+            'params': json.dumps(params),
+            'success': True,
+        }
+
+    def balance(self, address: str) -> dict:
+        rnd = random.Random(f'{address}-{int(time.monotonic() - self.started_at) // 60}')
+        return {
+            'address': address,
+            'balance': f'{rnd.uniform(0, 10 ** 8):.5f}',
+            'balance_lock': f'{rnd.uniform(0, 10 ** 6):.5f}',
+            'account_display': {'display': ''},
+        }
+
+    def ton_transaction(self, address: str, lt: int) -> dict:
+        rnd = random.Random(f'{address}-{lt}')
+        incoming = rnd.random() < 0.5
+        other = {'address': f'0:{rnd.getrandbits(256):064x}', 'name': None}
+        own = {'address': address, 'name': None}
+        return {
+            'hash': f'{address}-{lt}',
+            'lt': lt,
+            'utime': self.epoch + lt * 12,
+            'in_msg': {
+                'value': rnd.randint(1, 50000) * 10 ** 9,
+                'source': other if incoming else own,
+                'destination': own if incoming else other,
+            },
+        }
+
+    def ton_transactions(self, address: str, query: dict) -> list:
+        total = self.total(self.ton_volume)
+        limit = int(query.get('limit', [100])[0])
+        if query.get('sort_order', ['desc'])[0] == 'asc':
+            after_lt = int(query.get('after_lt', [0])[0])
+            lts = range(after_lt + 1, min(after_lt + limit, total) + 1)
+        else:
+            newest = min(total, int(query.get('before_lt', [total + 1])[0]) - 1)
+            lts = range(newest, max(newest - limit, 0), -1)
+        return [self.ton_transaction(address, lt) for lt in lts]
+
+    def subscan(self, resource: str, data: dict) -> dict:
+        if resource == 'transfers':
+            rows = [self.transfer(k) for k in self.page(self.total(self.volume), data)]
+            return {'code': 0, 'data': {'count': len(rows), 'transfers': rows}}
+        if resource == 'extrinsics':
+            rows = [self.extrinsic(k) for k in self.page(self.total(self.volume), data)]
+            return {'code': 0, 'data': {'count': len(rows), 'extrinsics': rows}}
+        if resource == 'accounts':
+            addresses = data.get('address') or [
+                self.address(k) for k in range(int(data.get('row', 100)))
+            ]
+            rows = [self.balance(address) for address in addresses]
+            return {'code': 0, 'data': {'count': len(rows), 'list': rows}}
+
+    def dapp_list(self) -> list:
+        return [
+            {'address': self.dapp_address(k), 'name': f'Dapp {k}'}
+            for k in range(self.dapps)
+        ]
+
+
+def make_handler(upstream: FakeUpstream, latency: float, error_rate: float):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, status: int, payload) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def delay(self) -> bool:
+            time.sleep(latency * random.uniform(0.5, 1.5))
+            return random.random() < error_rate
+
+        def ws_frame(self, payload: dict) -> None:
+            body = json.dumps(payload).encode()
+            if len(body) < 126:
+                header = bytes([0x81, len(body)])
+            else:
+                header = bytes([0x81, 126]) + len(body).to_bytes(2, 'big')
+            self.wfile.write(header + body)
+            self.wfile.flush()
+
+        def stream_heads(self) -> None:
+            key = self.headers['Sec-WebSocket-Key']
+            accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+            self.send_response(101)
+            self.send_header('Upgrade', 'websocket')
+            self.send_header('Connection', 'Upgrade')
+            self.send_header('Sec-WebSocket-Accept', accept)
+            self.end_headers()
+            # the subscription request: header, mask and masked payload
+            _, length = self.rfile.read(2)
+            self.rfile.read(4 + (length & 0x7F))
+            self.ws_frame({'jsonrpc': '2.0', 'id': 1, 'result': 'fake-subscription'})
+            try:
+                while True:
+                    time.sleep(upstream.block_time)
+                    number = FIRST_BLOCK + upstream.total(upstream.volume)
+                    self.ws_frame({
+                        'jsonrpc': '2.0',
+                        'method': 'chain_finalizedHead',
+                        'params': {
+                            'subscription': 'fake-subscription',
+                            'result': {'number': hex(number)},
+                        },
+                    })
+            except OSError:
+                pass
+
+        def stream_ton_events(self, accounts: list) -> None:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            try:
+                while True:
+                    time.sleep(1 / max(upstream.ton_volume * len(accounts), 0.01))
+                    event = {
+                        'account_id': random.choice(accounts),
+                        'lt': upstream.total(upstream.ton_volume),
+                        'tx_hash': f'{random.getrandbits(256):064x}',
+                    }
+                    self.wfile.write(f'event: message\ndata: {json.dumps(event)}\n\n'.encode())
+                    self.wfile.flush()
+            except OSError:
+                pass
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == '/astar-node':
+                return self.stream_heads()
+            if url.path == '/tonapi/sse/accounts/transactions':
+                accounts = parse_qs(url.query).get('accounts', [''])[0].split(',')
+                return self.stream_ton_events(accounts)
+            failed = self.delay()
+            if failed:
+                return self.reply(500, {'error': 'injected failure'})
+            match = re.fullmatch(r'/tonapi/blockchain/accounts/([^/]+)/transactions', url.path)
+            if match:
+                transactions = upstream.ton_transactions(match[1], parse_qs(url.query))
+                return self.reply(200, {'transactions': transactions})
+            match = re.fullmatch(r'/tonapi/address/([^/]+)/parse', url.path)
+            if match:
+                raw_form = f'0:{hashlib.sha256(match[1].encode()).hexdigest()}'
+                return self.reply(200, {'raw_form': raw_form})
+            if url.path == '/astar/dapps':
+                return self.reply(200, upstream.dapp_list())
+            self.reply(404, {'error': 'not found'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(length) or b'{}')
+            failed = self.delay()
+            path = urlsplit(self.path).path
+            if path.startswith('/telegram/') and path.endswith('/sendMessage'):
+                if failed:
+                    return self.reply(429, {
+                        'ok': False,
+                        'error_code': 429,
+                        'parameters': {'retry_after': 1},
+                    })
+                return self.reply(200, {'ok': True, 'result': {'text': data.get('text')}})
+            if failed:
+                return self.reply(500, {'error': 'injected failure'})
+            if path.startswith('/subscan/'):
+                payload = upstream.subscan(path[len('/subscan/'):], data)
+                if payload is not None:
+                    return self.reply(200, payload)
+            self.reply(404, {'error': 'not found'})
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = 'Serve synthetic Subscan, TonAPI, Astar dapps and Telegram endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8099)
+        parser.add_argument('--latency', type=float, default=50, help='mean latency, ms')
+        parser.add_argument('--error-rate', type=float, default=0.0)
+        parser.add_argument('--accounts', type=int, default=10000)
+        parser.add_argument('--dapps', type=int, default=100)
+        parser.add_argument('--volume', type=float, default=5, help='new Astar rows per second')
+        parser.add_argument('--ton-volume', type=float, default=0.2, help='new transactions per TON account per second')
+        parser.add_argument('--whale-ratio', type=float, default=0.1)
+        parser.add_argument('--block-time', type=float, default=12, help='seconds between streamed heads')
+
+    def handle(self, *args, **options):
+        upstream = FakeUpstream(options)
+        handler = make_handler(upstream, options['latency'] / 1000, options['error_rate'])
+        server = ThreadingHTTPServer((options['host'], options['port']), handler)
+        base = f'http://{options["host"]}:{options["port"]}'
+        self.stdout.write(
+            f'Serving on {base}, point the worker at it with:\n'
+            f'  SUBSCAN_API_V2_URL={base}/subscan/\n'
+            f'  TON_API_URL={base}/tonapi/\n'
+            f'  TELEGRAM_API_URL={base}/telegram/\n'
+            f'  ASTAR_DAPPS_URL={base}/astar/dapps\n'
+            f'  ASTAR_NODE_WS_URL={base.replace("http", "ws")}/astar-node'
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitor.watchlist import import_watchlist, read_watchlist
+
+
+class Command(BaseCommand):
+    help = 'Add TON accounts to the watchlist from a CSV (address,name) or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=('csv', 'json'), help='defaults to the file extension')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        fmt = options['format'] or path.suffix.lstrip('.').lower()
+        if fmt not in ('csv', 'json'):
+            raise CommandError('pass --format csv or --format json')
+        try:
+            entries = read_watchlist(path.read_text(), fmt)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        result = import_watchlist(entries)
+        self.stdout.write(
+            f'{len(result.created)} added, {len(result.existing)} already watched, '
+            f'{len(result.duplicates)} duplicates, {len(result.unresolved)} unresolved'
+        )
+        for address in result.duplicates:
+            self.stdout.write(f'duplicate: {address}')
+        for address in result.unresolved:
+            self.stdout.write(f'unresolved: {address}')
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from monitor import tasks
+from monitor.streaming import (ASTAR_STREAM, TON_STREAM, run_forever,
+                               stream_astar, stream_ton)
+
+
+class Command(BaseCommand):
+    help = 'Follow Astar finalized heads or TonAPI transaction events and trigger ingestion'
+
+    def add_arguments(self, parser):
+        parser.add_argument('feed', choices=(ASTAR_STREAM, TON_STREAM))
+
+    def handle(self, *args, **options):
+        if options['feed'] == ASTAR_STREAM:
+            def on_block(number):
+                tasks.get_latest_transfers.delay(from_stream=True)
+                tasks.get_latest_dapp_staking.delay(from_stream=True)
+
+            run_forever(ASTAR_STREAM, lambda: stream_astar(on_block))
+        else:
+            def on_transaction(address):
+                tasks.get_ton_account_transfers.delay(address)
+
+            run_forever(TON_STREAM, lambda: stream_ton(on_transaction))
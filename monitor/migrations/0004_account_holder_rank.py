@@ -0,0 +1,30 @@
+# Generated by Django 4.2.8 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0003_tonaccount_address_raw'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='account',
+            name='holder_rank',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunSQL(
+            sql=(
+                'UPDATE account AS a '
+                'SET holder_rank = ranked.holder_rank '
+                'FROM ('
+                '  SELECT id, COUNT(*) OVER (ORDER BY balance DESC) AS holder_rank '
+                '  FROM account'
+                ') AS ranked '
+                'WHERE a.id = ranked.id'
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
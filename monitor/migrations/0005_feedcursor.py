@@ -0,0 +1,30 @@
+# Generated by Django 4.2.8 on 2026-10-18 09:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0004_account_holder_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('value', models.CharField(blank=True, default='', max_length=100)),
+            ],
+            options={
+                'verbose_name': 'FeedCursor',
+                'verbose_name_plural': 'FeedCursors',
+                'db_table': 'feed_cursor',
+                'ordering': ['name'],
+            },
+        ),
+    ]
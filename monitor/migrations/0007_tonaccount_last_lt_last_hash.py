@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-18 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0006_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tonaccount',
+            name='last_lt',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='tonaccount',
+            name='last_hash',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
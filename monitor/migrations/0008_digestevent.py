@@ -0,0 +1,33 @@
+# Generated by Django 4.2.8 on 2026-10-18 11:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0007_tonaccount_last_lt_last_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('chat_id', models.CharField(max_length=50)),
+                ('group', models.CharField(max_length=500)),
+                ('amount', models.DecimalField(decimal_places=5, default=0.0, max_digits=30)),
+                ('asset_symbol', models.CharField(blank=True, max_length=20)),
+            ],
+            options={
+                'verbose_name': 'DigestEvent',
+                'verbose_name_plural': 'DigestEvents',
+                'db_table': 'digest_event',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['chat_id', 'created_at'], name='digest_chat_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.8 on 2026-10-18 12:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0008_digestevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['-balance'], name='account_balance_desc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(condition=models.Q(('name', ''), _negated=True), fields=['address'], include=('balance', 'balance_lock'), name='account_named_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['-created_at'], name='transfer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['from_account', '-created_at'], name='transfer_from_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfer',
+            index=models.Index(fields=['to_account', '-created_at'], name='transfer_to_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='transfer',
+            name='from_account',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transfers_from', to='monitor.account'),
+        ),
+        migrations.AlterField(
+            model_name='transfer',
+            name='to_account',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transfers_to', to='monitor.account'),
+        ),
+        migrations.AddIndex(
+            model_name='tontransfer',
+            index=models.Index(fields=['-created_at'], name='ton_transfer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tontransfer',
+            index=models.Index(fields=['source_address', '-created_at'], name='ton_transfer_src_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tontransfer',
+            index=models.Index(fields=['destination_address', '-created_at'], name='ton_transfer_dst_created_idx'),
+        ),
+    ]
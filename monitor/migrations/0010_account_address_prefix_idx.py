@@ -0,0 +1,17 @@
+# Generated by Django 4.2.8 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0009_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(fields=['address'], name='account_address_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.8 on 2026-10-18 15:00
+
+from django.db import migrations, models
+
+
+def to_base_units(table):
+    return migrations.RunSQL(
+        f'ALTER TABLE {table} ALTER COLUMN amount TYPE numeric(40, 0) '
+        f'USING round(amount * (10::numeric ^ decimals))',
+        f'ALTER TABLE {table} ALTER COLUMN amount TYPE numeric(30, 5) '
+        f'USING round(amount / (10::numeric ^ decimals), 5)',
+        state_operations=[
+            migrations.AlterField(
+                model_name=table.replace('_', ''),
+                name='amount',
+                field=models.DecimalField(decimal_places=0, default=0, max_digits=40),
+            ),
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0010_account_address_prefix_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transfer',
+            name='decimals',
+            field=models.PositiveSmallIntegerField(default=18),
+        ),
+        to_base_units('transfer'),
+        migrations.AddField(
+            model_name='digestevent',
+            name='decimals',
+            field=models.PositiveSmallIntegerField(default=18),
+        ),
+        migrations.RunSQL(
+            "UPDATE digest_event SET decimals = 9 WHERE asset_symbol = 'TON'",
+            migrations.RunSQL.noop,
+        ),
+        to_base_units('digest_event'),
+        migrations.RunSQL(
+            'ALTER TABLE ton_transfer ALTER COLUMN amount TYPE bigint '
+            'USING round(amount * 1000000000)',
+            'ALTER TABLE ton_transfer ALTER COLUMN amount TYPE numeric(30, 5) '
+            'USING amount / 1000000000.0',
+            state_operations=[
+                migrations.AlterField(
+                    model_name='tontransfer',
+                    name='amount',
+                    field=models.BigIntegerField(default=0),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.8 on 2026-10-18 16:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0011_base_unit_amounts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VolumeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('dimension', models.CharField(choices=[('account', 'Account'), ('dapp', 'Dapp'), ('module', 'Module'), ('asset', 'Asset')], max_length=10)),
+                ('key', models.CharField(max_length=100)),
+                ('asset_symbol', models.CharField(max_length=20)),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('decimals', models.PositiveSmallIntegerField(default=18)),
+                ('inflow', models.DecimalField(decimal_places=0, default=0, max_digits=40)),
+                ('outflow', models.DecimalField(decimal_places=0, default=0, max_digits=40)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'VolumeRollup',
+                'verbose_name_plural': 'VolumeRollups',
+                'db_table': 'volume_rollup',
+                'ordering': ['-bucket'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='volumerollup',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key', 'asset_symbol', 'period', 'bucket'), name='volume_rollup_bucket_uniq'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.8 on 2026-10-18 17:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0012_volumerollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=5, default=0.0, max_digits=30)),
+                ('balance_lock', models.DecimalField(decimal_places=5, default=0.0, max_digits=30)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='monitor.account')),
+            ],
+            options={
+                'verbose_name': 'BalanceSnapshot',
+                'verbose_name_plural': 'BalanceSnapshots',
+                'db_table': 'balance_snapshot',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['account', '-created_at'], name='balance_snapshot_account_idx')],
+            },
+        ),
+        migrations.RunSQL(
+            'INSERT INTO balance_snapshot (account_id, balance, balance_lock, created_at) '
+            "SELECT id, balance, balance_lock, updated_at FROM account WHERE name <> '' OR balance > 0",
+            migrations.RunSQL.noop,
+        ),
+    ]
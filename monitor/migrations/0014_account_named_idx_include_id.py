@@ -0,0 +1,21 @@
+# Generated by Django 4.2.8 on 2026-10-18 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0013_balancesnapshot'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='account',
+            name='account_named_idx',
+        ),
+        migrations.AddIndex(
+            model_name='account',
+            index=models.Index(condition=models.Q(('name', ''), _negated=True), fields=['address'], include=('id', 'balance', 'balance_lock'), name='account_named_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.8 on 2026-10-18 20:00
+
+from django.db import migrations
+
+CANONICAL_DECIMALS = "CASE asset_symbol WHEN 'TON' THEN 9 ELSE 18 END"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitor', '0014_account_named_idx_include_id'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'UPDATE volume_rollup SET '
+            f'  inflow = trunc(inflow * 10::numeric ^ ({CANONICAL_DECIMALS} - decimals)), '
+            f'  outflow = trunc(outflow * 10::numeric ^ ({CANONICAL_DECIMALS} - decimals)), '
+            f'  decimals = {CANONICAL_DECIMALS} '
+            f'WHERE decimals <> {CANONICAL_DECIMALS}',
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,7 +1,13 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import connection, models
+from django.utils import timezone
 
 from core import models as core_models
-from core.tonapi import make_tonapi_request
+from core.amounts import ASSET_DECIMALS, asset_decimals, from_base_units
+from core.tonapi import parse_address
+
+ROLLUP_BATCH_SIZE = 1000
 
 
 class Account(core_models.TimeTrackable):
@@ -10,10 +16,40 @@ class Account(core_models.TimeTrackable):
     address = models.CharField(max_length=100, unique=True)
     balance = models.DecimalField(max_digits=30, decimal_places=5, default=0.0)
     balance_lock = models.DecimalField(max_digits=30, decimal_places=5, default=0.0)
+    holder_rank = models.PositiveIntegerField(null=True, blank=True, db_index=True)
 
     @property
-    def rank(self) -> int:
-        return Account.objects.filter(balance__gte=self.balance).count()
+    def rank(self) -> [int, None]:
+        return self.holder_rank
+
+    @classmethod
+    def get_ranks(cls, account_ids) -> dict:
+        return dict(
+            cls.objects.filter(id__in=account_ids)
+            .values_list('id', 'holder_rank')
+        )
+
+    @classmethod
+    def refresh_ranks(cls) -> int:
+        """
+        Recompute holder_rank for every account in a single UPDATE.
+
+        The rank of an account is the number of accounts whose balance
+        is greater than or equal to its own. Accounts created since the
+        last refresh stay unranked until the next one.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {cls._meta.db_table} AS a '
+                f'SET holder_rank = ranked.holder_rank '
+                f'FROM ('
+                f'  SELECT id, COUNT(*) OVER (ORDER BY balance DESC) AS holder_rank '
+                f'  FROM {cls._meta.db_table}'
+                f') AS ranked '
+                f'WHERE a.id = ranked.id '
+                f'AND a.holder_rank IS DISTINCT FROM ranked.holder_rank'
+            )
+            return cursor.rowcount
 
     @property
     def subscan_link(self) -> str:
@@ -32,16 +68,35 @@ class Account(core_models.TimeTrackable):
         verbose_name = 'Account'
         verbose_name_plural = 'Accounts'
         ordering = ['-balance']
+        indexes = [
+            models.Index(fields=['-balance'], name='account_balance_desc_idx'),
+            models.Index(
+                fields=['address'],
+                name='account_address_prefix_idx',
+                opclasses=['varchar_pattern_ops'],
+            ),
+            # covers get_account_balances' snapshot as an index-only scan
+            models.Index(
+                fields=['address'],
+                name='account_named_idx',
+                include=['id', 'balance', 'balance_lock'],
+                condition=~models.Q(name=''),
+            ),
+        ]
 
 
 class Dapp(core_models.TimeTrackable):
     name = models.CharField(max_length=100)
     account = models.OneToOneField(Account, on_delete=models.CASCADE)
 
+    @staticmethod
+    def make_portal_link(address: str, name: str) -> str:
+        url = 'https://portal.astar.network/astar/dapp-staking/dapp?dapp='
+        return f"<a href='{url}{address}'>{name}</a>"
+
     @property
     def portal_link(self) -> str:
-        url = 'https://portal.astar.network/astar/dapp-staking/dapp?dapp='
-        return f"<a href='{url}{self.account.address}'>{self.name}</a>"
+        return self.make_portal_link(self.account.address, self.name)
 
     def __str__(self):
         return self.name
@@ -53,28 +108,167 @@ class Dapp(core_models.TimeTrackable):
         ordering = ['name']
 
 
+class FeedCursor(core_models.TimeTrackable):
+    name = models.CharField(max_length=100, unique=True)
+    value = models.CharField(max_length=100, blank=True, default='')
+
+    @classmethod
+    def get_value(cls, name: str) -> [str, None]:
+        return (
+            cls.objects.filter(name=name)
+            .values_list('value', flat=True)
+            .first()
+        ) or None
+
+    @classmethod
+    def set_value(cls, name: str, value: str) -> None:
+        cls.objects.update_or_create(name=name, defaults={'value': value})
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+    class Meta:
+        db_table = 'feed_cursor'
+        verbose_name = 'FeedCursor'
+        verbose_name_plural = 'FeedCursors'
+        ordering = ['name']
+
+
+class OutboxMessage(core_models.TimeTrackable):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    chat_id = models.CharField(max_length=50)
+    text = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True, default='')
+
+    def __str__(self):
+        return f'{self.chat_id}: {self.text[:50]}'
+
+    class Meta:
+        db_table = 'outbox_message'
+        verbose_name = 'OutboxMessage'
+        verbose_name_plural = 'OutboxMessages'
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['chat_id', 'id'],
+                name='outbox_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+
+
+class DigestEvent(core_models.TimeTrackable):
+    chat_id = models.CharField(max_length=50)
+    group = models.CharField(max_length=500)
+    # base units, see core.amounts
+    amount = models.DecimalField(max_digits=40, decimal_places=0, default=0)
+    decimals = models.PositiveSmallIntegerField(default=18)
+    asset_symbol = models.CharField(max_length=20, blank=True)
+
+    def __str__(self):
+        return f'{self.chat_id}: {from_base_units(self.amount, self.decimals)} {self.asset_symbol}'
+
+    class Meta:
+        db_table = 'digest_event'
+        verbose_name = 'DigestEvent'
+        verbose_name_plural = 'DigestEvents'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['chat_id', 'created_at'], name='digest_chat_created_idx'),
+        ]
+
+
+class BalanceSnapshot(models.Model):
+    """
+    Append-only balance history: one row each time a refresh sees an
+    account's balance change, so the balance at any moment is the
+    latest row at or before it.
+    """
+    account = models.ForeignKey(
+        Account,
+        on_delete=models.CASCADE,
+        related_name='balance_snapshots',
+        db_index=False,
+    )
+    balance = models.DecimalField(max_digits=30, decimal_places=5, default=0.0)
+    balance_lock = models.DecimalField(max_digits=30, decimal_places=5, default=0.0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def balances_at(cls, account_ids, moment) -> dict:
+        """
+        Balance of each account at ``moment``, one index probe per
+        account however long its history is.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT a.id, s.balance '
+                f'FROM unnest(%s::bigint[]) AS a(id) '
+                f'CROSS JOIN LATERAL ('
+                f'  SELECT balance FROM {cls._meta.db_table} '
+                f'  WHERE account_id = a.id AND created_at <= %s '
+                f'  ORDER BY created_at DESC LIMIT 1'
+                f') AS s',
+                [list(account_ids), moment],
+            )
+            return dict(cursor.fetchall())
+
+    def __str__(self):
+        return f'{self.account_id}: {self.balance} at {self.created_at}'
+
+    class Meta:
+        db_table = 'balance_snapshot'
+        verbose_name = 'BalanceSnapshot'
+        verbose_name_plural = 'BalanceSnapshots'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['account', '-created_at'], name='balance_snapshot_account_idx'),
+        ]
+
+
 class Transfer(core_models.TimeTrackable):
     extrinsic_index = models.CharField(max_length=30, unique=True)
+    # indexed through the (account, created_at) composites below
     from_account = models.ForeignKey(
         Account,
         on_delete=models.CASCADE,
-        related_name='transfers_from'
+        related_name='transfers_from',
+        db_index=False,
     )
     to_account = models.ForeignKey(
         Account,
         on_delete=models.CASCADE,
-        related_name='transfers_to'
+        related_name='transfers_to',
+        db_index=False,
     )
     asset_symbol = models.CharField(max_length=20, blank=True)
     module = models.CharField(max_length=20, blank=True)
-    amount = models.DecimalField(max_digits=30, decimal_places=5, default=0.0)
+    # exact base units (planck for ASTR), scaled by decimals for display
+    amount = models.DecimalField(max_digits=40, decimal_places=0, default=0)
+    decimals = models.PositiveSmallIntegerField(default=18)
     usd_amount = models.DecimalField(max_digits=30, decimal_places=5, default=0.0)
 
+    @property
+    def display_amount(self) -> Decimal:
+        return from_base_units(self.amount, self.decimals)
+
     def __str__(self):
         return (
             f'From: {self.from_account} '
             f'To: {self.to_account} '
-            f'Amount: {self.amount} {self.asset_symbol} ({self.usd_amount} USD)'
+            f'Amount: {self.display_amount} {self.asset_symbol} ({self.usd_amount} USD)'
         )
 
     class Meta:
@@ -82,17 +276,23 @@ class Transfer(core_models.TimeTrackable):
         verbose_name = 'Transfer'
         verbose_name_plural = 'Transfers'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='transfer_created_idx'),
+            models.Index(fields=['from_account', '-created_at'], name='transfer_from_created_idx'),
+            models.Index(fields=['to_account', '-created_at'], name='transfer_to_created_idx'),
+        ]
 
 
 class TONAccount(core_models.TimeTrackable):
     name = models.CharField(max_length=100, blank=True, default='')
     address = models.CharField(max_length=100, unique=True)
     address_raw = models.CharField(max_length=100, unique=True, blank=True)
+    last_lt = models.BigIntegerField(null=True, blank=True)
+    last_hash = models.CharField(max_length=100, blank=True, default='')
 
     def save(self, *args, **kwargs):
         if not self.address_raw:
-            address_info = make_tonapi_request(f'address/{self.address}/parse')
-            self.address_raw = address_info.get('raw_form', '') if address_info else ''
+            self.address_raw = parse_address(self.address) or ''
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -109,7 +309,12 @@ class TONTransfer(core_models.TimeTrackable):
     hash = models.CharField(max_length=100, unique=True)
     source_address = models.CharField(max_length=100)
     destination_address = models.CharField(max_length=100)
-    amount = models.DecimalField(max_digits=30, decimal_places=5, default=0.0)
+    # nanotons
+    amount = models.BigIntegerField(default=0)
+
+    @property
+    def display_amount(self) -> Decimal:
+        return from_base_units(self.amount, ASSET_DECIMALS['TON'])
 
     def __str__(self):
         return self.hash
@@ -119,3 +324,87 @@ class TONTransfer(core_models.TimeTrackable):
         verbose_name = 'TONTransfer'
         verbose_name_plural = 'TONTransfers'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='ton_transfer_created_idx'),
+            models.Index(fields=['source_address', '-created_at'], name='ton_transfer_src_created_idx'),
+            models.Index(fields=['destination_address', '-created_at'], name='ton_transfer_dst_created_idx'),
+        ]
+
+
+class VolumeRollup(core_models.TimeTrackable):
+    HOUR = 'hour'
+    DAY = 'day'
+    PERIOD_CHOICES = (
+        (HOUR, 'Hour'),
+        (DAY, 'Day'),
+    )
+
+    ACCOUNT = 'account'
+    DAPP = 'dapp'
+    MODULE = 'module'
+    ASSET = 'asset'
+    DIMENSION_CHOICES = (
+        (ACCOUNT, 'Account'),
+        (DAPP, 'Dapp'),
+        (MODULE, 'Module'),
+        (ASSET, 'Asset'),
+    )
+
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=100)
+    asset_symbol = models.CharField(max_length=20)
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    bucket = models.DateTimeField()
+    # base units of the asset's canonical decimals, see core.amounts
+    decimals = models.PositiveSmallIntegerField(default=18)
+    inflow = models.DecimalField(max_digits=40, decimal_places=0, default=0)
+    outflow = models.DecimalField(max_digits=40, decimal_places=0, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def add(cls, deltas: dict) -> int:
+        """
+        Add ``{(dimension, key, asset_symbol, period, bucket):
+        (inflow, outflow, count)}`` to the stored rows with upserts.
+        Amounts are base units of the asset's canonical decimals.
+
+        Rows are written in key order so concurrent ingestion tasks lock
+        shared rows (module, asset) in the same order.
+        """
+        rows = [
+            (*group, asset_decimals(group[2]), inflow, outflow, count)
+            for group, (inflow, outflow, count) in sorted(deltas.items())
+        ]
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            for i in range(0, len(rows), ROLLUP_BATCH_SIZE):
+                batch = rows[i:i + ROLLUP_BATCH_SIZE]
+                placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, now(), now())'] * len(batch))
+                cursor.execute(
+                    f'INSERT INTO {table} '
+                    f'  (dimension, key, asset_symbol, period, bucket, decimals, '
+                    f'   inflow, outflow, count, created_at, updated_at) '
+                    f'VALUES {placeholders} '
+                    f'ON CONFLICT (dimension, key, asset_symbol, period, bucket) DO UPDATE SET '
+                    f'  inflow = {table}.inflow + EXCLUDED.inflow, '
+                    f'  outflow = {table}.outflow + EXCLUDED.outflow, '
+                    f'  count = {table}.count + EXCLUDED.count, '
+                    f'  updated_at = EXCLUDED.updated_at',
+                    [value for row in batch for value in row],
+                )
+        return len(rows)
+
+    def __str__(self):
+        return f'{self.dimension} {self.key} {self.asset_symbol} {self.period} {self.bucket}'
+
+    class Meta:
+        db_table = 'volume_rollup'
+        verbose_name = 'VolumeRollup'
+        verbose_name_plural = 'VolumeRollups'
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dimension', 'key', 'asset_symbol', 'period', 'bucket'],
+                name='volume_rollup_bucket_uniq',
+            ),
+        ]
@@ -0,0 +1,74 @@
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from core.amounts import asset_decimals, rescale
+from monitor.models import VolumeRollup
+
+PERIODS = (VolumeRollup.HOUR, VolumeRollup.DAY)
+STAKE_FUNCTIONS = ('bond_and_stake',)
+
+
+def bucket_start(moment: datetime, period: str) -> datetime:
+    moment = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if period == VolumeRollup.DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def add_flow(
+        deltas: dict,
+        dimension: str,
+        key: str,
+        asset_symbol: str,
+        decimals: int,
+        created_at: datetime,
+        inflow: int = 0,
+        outflow: int = 0,
+) -> None:
+    # one scale per asset, so every row of a bucket adds up
+    canonical = asset_decimals(asset_symbol)
+    inflow = rescale(inflow, decimals, canonical)
+    outflow = rescale(outflow, decimals, canonical)
+    for period in PERIODS:
+        group = (dimension, key, asset_symbol, period, bucket_start(created_at, period))
+        total_in, total_out, count = deltas.get(group, (0, 0, 0))
+        deltas[group] = (total_in + inflow, total_out + outflow, count + 1)
+
+
+def transfer_deltas(transfers: list) -> dict:
+    """Account in/outflow, module and asset volume of Transfer rows."""
+    deltas = {}
+    for transfer in transfers:
+        amount = int(transfer.amount)
+        flow = (transfer.asset_symbol, transfer.decimals, transfer.created_at)
+        add_flow(deltas, VolumeRollup.ACCOUNT, transfer.from_account.address, *flow, outflow=amount)
+        add_flow(deltas, VolumeRollup.ACCOUNT, transfer.to_account.address, *flow, inflow=amount)
+        add_flow(deltas, VolumeRollup.MODULE, transfer.module, *flow, inflow=amount)
+        add_flow(deltas, VolumeRollup.ASSET, transfer.asset_symbol, *flow, inflow=amount)
+    return deltas
+
+
+def staking_deltas(events: list) -> dict:
+    """Dapp stake (inflow) and unstake (outflow), and module volume."""
+    deltas = {}
+    for transfer, dapp_address in events:
+        amount = int(transfer.amount)
+        flow = (transfer.asset_symbol, transfer.decimals, transfer.created_at)
+        if transfer.module in STAKE_FUNCTIONS:
+            add_flow(deltas, VolumeRollup.DAPP, dapp_address, *flow, inflow=amount)
+        else:
+            add_flow(deltas, VolumeRollup.DAPP, dapp_address, *flow, outflow=amount)
+        add_flow(deltas, VolumeRollup.MODULE, transfer.module, *flow, inflow=amount)
+    return deltas
+
+
+def ton_deltas(transfers: list, decimals: int) -> dict:
+    """Account in/outflow and asset volume of parsed TON transfers."""
+    deltas = {}
+    for transfer in transfers:
+        amount = transfer['amount']
+        flow = ('TON', decimals, transfer['created_at'])
+        add_flow(deltas, VolumeRollup.ACCOUNT, transfer['source_address'], *flow, outflow=amount)
+        add_flow(deltas, VolumeRollup.ACCOUNT, transfer['destination_address'], *flow, inflow=amount)
+        add_flow(deltas, VolumeRollup.ASSET, 'TON', *flow, inflow=amount)
+    return deltas
@@ -0,0 +1,131 @@
+import json
+import os
+import random
+import time
+
+import websocket
+from celery.utils.log import get_task_logger
+from django.core.cache import cache
+
+from core.http import HTTP_CONNECT_TIMEOUT, get_session
+from core.tonapi import TON_API_KEY, TON_API_URL
+from monitor.models import TONAccount
+
+logger = get_task_logger(__name__)
+
+ASTAR_NODE_WS_URL = os.getenv('ASTAR_NODE_WS_URL', 'wss://rpc.astar.network')
+STREAM_HEARTBEAT_TTL = int(os.getenv('STREAM_HEARTBEAT_TTL', 60))
+STREAM_READ_TIMEOUT = int(os.getenv('STREAM_READ_TIMEOUT', 60))
+# reconnect now and then so newly watched TON accounts join the stream
+STREAM_RESUBSCRIBE_EVERY = int(os.getenv('STREAM_RESUBSCRIBE_EVERY', 600))
+STREAM_MAX_BACKOFF = 60
+
+ASTAR_STREAM = 'astar'
+TON_STREAM = 'ton'
+
+
+def stream_alive(name: str) -> bool:
+    """True while a streamer keeps its heartbeat fresh, beat polls then step aside."""
+    return bool(cache.get(f'stream:{name}:alive'))
+
+
+def mark_stream_alive(name: str) -> None:
+    cache.set(f'stream:{name}:alive', 1, STREAM_HEARTBEAT_TTL)
+
+
+def run_forever(name: str, connect) -> None:
+    """
+    Run ``connect`` until interrupted, reconnecting with jittered backoff.
+
+    ``connect`` returns when the stream ends; ingestion resumes from the
+    persisted cursors, so anything missed while disconnected is fetched
+    by the catch-up poll triggered on reconnect (or by beat meanwhile).
+    """
+    backoff = 1
+    while True:
+        started_at = time.monotonic()
+        try:
+            connect()
+        except (ConnectionError, OSError, ValueError, websocket.WebSocketException) as e:
+            logger.info(f'stream {name}: {e.__class__.__name__}: {e}')
+        cache.delete(f'stream:{name}:alive')
+        if time.monotonic() - started_at > STREAM_MAX_BACKOFF:
+            backoff = 1
+        time.sleep(backoff * random.uniform(0.5, 1.5))
+        backoff = min(backoff * 2, STREAM_MAX_BACKOFF)
+
+
+def stream_astar(on_block) -> None:
+    """
+    Follow finalized heads of the Astar node.
+
+    Events are not decoded here: each new head calls ``on_block`` which
+    triggers the regular Subscan ingestion, so filtering and persistence
+    stay identical to polling.
+    """
+    ws = websocket.create_connection(ASTAR_NODE_WS_URL, timeout=STREAM_READ_TIMEOUT)
+    try:
+        ws.send(json.dumps({
+            'id': 1,
+            'jsonrpc': '2.0',
+            'method': 'chain_subscribeFinalizedHeads',
+            'params': [],
+        }))
+        mark_stream_alive(ASTAR_STREAM)
+        on_block(None)
+        while True:
+            text = ws.recv()
+            if not text:
+                # websocket-client answers a close frame and returns ''
+                raise ConnectionError('websocket closed by server')
+            message = json.loads(text)
+            if 'error' in message:
+                raise ConnectionError(message['error'])
+            result = message.get('params', {}).get('result')
+            if not result:
+                continue
+            mark_stream_alive(ASTAR_STREAM)
+            on_block(int(result['number'], 16))
+    finally:
+        ws.close()
+
+
+def stream_ton(on_transaction) -> None:
+    """
+    Follow TonAPI's server-sent transaction events for watched accounts.
+
+    ``on_transaction`` gets the raw address of every account with a new
+    transaction; the fetch itself goes through the lt cursor path.
+    """
+    accounts = list(
+        TONAccount.objects.exclude(address_raw='')
+        .values_list('address_raw', flat=True)
+    )
+    if not accounts:
+        time.sleep(STREAM_RESUBSCRIBE_EVERY)
+        return
+
+    response = get_session('tonapi_stream', retry_statuses=()).get(
+        TON_API_URL + 'sse/accounts/transactions',
+        params={'accounts': ','.join(accounts)},
+        headers={'Authorization': f'Bearer {TON_API_KEY}'},
+        stream=True,
+        timeout=(HTTP_CONNECT_TIMEOUT, STREAM_READ_TIMEOUT),
+    )
+    try:
+        if response.status_code != 200:
+            raise ConnectionError(f'sse status {response.status_code}')
+        mark_stream_alive(TON_STREAM)
+        for address in accounts:
+            on_transaction(address)
+
+        deadline = time.monotonic() + STREAM_RESUBSCRIBE_EVERY
+        for line in response.iter_lines(decode_unicode=True):
+            mark_stream_alive(TON_STREAM)
+            if line and line.startswith('data:'):
+                event = json.loads(line[len('data:'):])
+                on_transaction(event['account_id'])
+            if time.monotonic() > deadline:
+                return
+    finally:
+        response.close()
@@ -1,288 +1,486 @@
-import json
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from decimal import Decimal
 
-import requests
 from celery import shared_task
 from celery.utils.log import get_task_logger
-
-from core.subscan import make_request
-from core.telegram_bot import (create_extrinsic_message,
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.amounts import ASSET_DECIMALS, from_base_units
+from core.cache import cached_json
+from core.http import get_session, request
+from core.locks import single_flight
+from core.subscan import fetch_since, make_cached_request, make_request
+from core.telegram_bot import (chat_bucket, create_balance_change_message,
+                               create_extrinsic_messages,
                                create_new_dapp_message,
                                create_ton_transfer_message,
-                               create_transfer_message, send_message)
-from core.tonapi import make_tonapi_request
-from monitor.models import Account, Dapp, TONAccount, TONTransfer, Transfer
+                               create_transfer_messages, deliver_message,
+                               enqueue_messages, tonviewer_link)
+from core.tonapi import fetch_account_transactions
+from monitor.archive import archive_expired
+from monitor.balances import balance_moves, record_balances
+from monitor.dapps import (get_dapp, get_dapp_registry,
+                           invalidate_dapp_registry)
+from monitor.digest import Alert, flush_digests, route_alerts
+from monitor.ingest import (ingest_staking, ingest_ton_transactions,
+                            ingest_transfers)
+from monitor.models import (Account, Dapp, FeedCursor, OutboxMessage,
+                            TONAccount)
+from monitor.streaming import ASTAR_STREAM, TON_STREAM, stream_alive
+from monitor.watchlist import (WATCHLIST_REPORT_TTL, import_report_key,
+                               import_watchlist)
 
 logger = get_task_logger(__name__)
 
 
 ASTAR_CHAT_ID = os.getenv('TELEGRAM_ASTAR_CHAT_ID')
 TON_CHAT_ID = os.getenv('TELEGRAM_TON_CHAT_ID')
-ASTAR_TRANSFER_LOWER_LIMIT = int(os.getenv('ASTAR_TRANSFER_LOWER_LIMIT', 1000000))
-TON_TRANSFER_LOWER_LIMIT = int(os.getenv('TON_TRANSFER_LOWER_LIMIT', 10000))
+TON_POLL_WORKERS = int(os.getenv('TON_POLL_WORKERS', 8))
+SUBSCAN_POOL_WORKERS = int(os.getenv('SUBSCAN_POOL_WORKERS', 4))
+SUBSCAN_MAX_ADDRESSES = 100
+BALANCE_QUANTUM = Decimal('0.00001')
 
+ASTAR_DAPPS_URL = os.getenv(
+    'ASTAR_DAPPS_URL',
+    'https://api.astar.network/api/v1/astar/dapps-staking/dapps',
+)
 
-@shared_task
-def get_latest_transfers() -> None:
-    data = {'row': 100, 'page': 0}
-    response = make_request('transfers', data)
-    if not response:
-        logger.info('make_request has failed')
-        return
+DAPPS_CACHE_TTL = int(os.getenv('DAPPS_CACHE_TTL', 600))
+TOP_HOLDERS_CACHE_TTL = int(os.getenv('TOP_HOLDERS_CACHE_TTL', 300))
 
-    for transfer in reversed(response['data']['transfers']):
-        amount = float(transfer.get('amount', 0))
-        usd_amount = float(transfer.get('usd_amount', 0))
-        asset_symbol = transfer.get('asset_symbol', '')
+TRANSFERS_FEED = 'transfers'
+DAPP_STAKING_FEED = 'dapp_staking'
 
-        if (
-            not transfer.get('success')
-            or float(amount) < ASTAR_TRANSFER_LOWER_LIMIT
-        ):
-            continue
+OUTBOX_LOCK_ID = 7001
+OUTBOX_DELIVERY_BUDGET = int(os.getenv('OUTBOX_DELIVERY_BUDGET', 50))
+OUTBOX_RETENTION_DAYS = int(os.getenv('OUTBOX_RETENTION_DAYS', 7))
+OUTBOX_PRUNE_BATCH_SIZE = 10000
 
-        from_account, _ = Account.objects.get_or_create(
-            address=transfer.get('from'),
-            defaults={
-                'display': transfer.get(
-                    'from_account_display', {}
-                ).get('display', ''),
-            }
-        )
-        to_account, _ = Account.objects.get_or_create(
-            address=transfer.get('to'),
-            defaults={
-                'display': transfer.get(
-                    'to_address_display', {}
-                ).get('display', ''),
-            }
-        )
-        _, created = Transfer.objects.get_or_create(
-            extrinsic_index=transfer.get('extrinsic_index'),
-            defaults={
-                'from_account': from_account,
-                'to_account': to_account,
-                'asset_symbol': asset_symbol,
-                'module': transfer.get('module', ''),
-                'amount': amount,
-                'usd_amount': usd_amount,
-            },
-        )
 
-        if created:
-            send_message(
-                ASTAR_CHAT_ID,
-                create_transfer_message(
-                    from_account,
-                    to_account,
-                    amount,
-                    usd_amount,
-                    asset_symbol,
-                )
+def notify(chat_id: str, alerts: list) -> None:
+    """
+    Queue alerts in the outbox (or digest buffer).
+
+    Callers run this in the transaction that stored the rows the alerts
+    are about, so either both are committed or neither is; delivery is
+    only kicked once that transaction commits.
+    """
+    messages = route_alerts(chat_id, alerts)
+    if messages:
+        enqueue_messages(chat_id, messages)
+    flushed = len(messages) < len(alerts) and flush_digests()
+    if messages or flushed:
+        transaction.on_commit(deliver_messages.delay)
+
+
+@shared_task
+@single_flight()
+def get_latest_transfers(from_stream: bool = False) -> int:
+    if not from_stream and stream_alive(ASTAR_STREAM):
+        return 0
+    cursor = FeedCursor.get_value(TRANSFERS_FEED)
+    rows = fetch_since('transfers', {'row': 100}, 'transfers', cursor)
+    if rows is None:
+        logger.info('make_request has failed')
+        return
+
+    with transaction.atomic():
+        transfers = ingest_transfers(rows)
+        notify(ASTAR_CHAT_ID, [
+            Alert(
+                text,
+                f'{transfer.from_account.subscan_link} → {transfer.to_account.subscan_link}',
+                transfer.amount,
+                transfer.asset_symbol,
+                transfer.decimals,
             )
+            for transfer, text in zip(transfers, create_transfer_messages(transfers))
+        ])
+        if rows:
+            FeedCursor.set_value(TRANSFERS_FEED, rows[-1]['extrinsic_index'])
+    return len(rows)
 
 
 @shared_task
-def get_latest_dapp_staking() -> None:
+@single_flight()
+def get_latest_dapp_staking(from_stream: bool = False) -> int:
+    if not from_stream and stream_alive(ASTAR_STREAM):
+        return 0
     data = {
         'row': 100,
-        'page': 0,
         'module': 'dappsstaking'
     }
-    response = make_request('extrinsics', data)
-    if not response:
+    cursor = FeedCursor.get_value(DAPP_STAKING_FEED)
+    rows = fetch_since('extrinsics', data, 'extrinsics', cursor)
+    if rows is None:
         logger.info('get_latest_dapp_staking has failed')
         return
 
-    for transaction in reversed(response['data']['extrinsics']):
-        call_module_function = transaction.get('call_module_function')
-        extrinsic_index = transaction.get('extrinsic_index')
-        params = transaction.get('params')
-
-        if (
-            not transaction.get('success')
-            or not call_module_function
-            or not params
-            or call_module_function not in (
-                'bond_and_stake',
-                'unbond_and_unstake',
+    dapps = get_dapp_registry()
+    with transaction.atomic():
+        events = [
+            (transfer, get_dapp(dapp_address, dapps))
+            for transfer, dapp_address in ingest_staking(rows)
+        ]
+        notify(ASTAR_CHAT_ID, [
+            Alert(
+                text,
+                f'{transfer.module} {dapp.portal_link}',
+                transfer.amount,
+                transfer.asset_symbol,
+                transfer.decimals,
             )
-        ):
-            continue
+            for (transfer, dapp), text in zip(events, create_extrinsic_messages(events))
+        ])
+        if rows:
+            FeedCursor.set_value(DAPP_STAKING_FEED, rows[-1]['extrinsic_index'])
+    return len(rows)
 
-        params = json.loads(params)
 
-        account_address = None
-        amount = 0
-        asset_symbol = 'ASTR'
-        dapp_address = None
-        for param in params:
-            if param.get('type_name') == 'SmartContract':
-                value = param.get('value')
-                if value:
-                    dapp_address = value.get('Evm')
+@shared_task
+@single_flight()
+def check_new_dapps() -> int:
+    def fetch(headers):
+        response = request(get_session('astar'), 'GET', ASTAR_DAPPS_URL, headers=headers)
+        if response is not None:
+            logger.info(f'check_dapps: {ASTAR_DAPPS_URL} {response.status_code}')
+        return response
+
+    response = cached_json('astar:dapps', ASTAR_DAPPS_URL, DAPPS_CACHE_TTL, fetch)
+    if response is None or not response.changed:
+        return 0
 
-            if param.get('type_name') == 'Balance':
-                amount = int(param.get('value', 0)) / 10 ** 18
+    dapp_addresses = set(
+        Dapp.objects.values_list('account__address', flat=True)
+    )
+    alerts = []
+    with transaction.atomic():
+        for row in response.payload:
+            address = row.get('address', '').lower()
+            if address not in dapp_addresses:
+                account, _ = Account.objects.get_or_create(address=address)
+                dapp = Dapp.objects.create(
+                    name=row.get('name'),
+                    account=account,
+                )
+                alerts.append(Alert(create_new_dapp_message(dapp)))
+        notify(ASTAR_CHAT_ID, alerts)
+        transaction.on_commit(response.commit)
+    if alerts:
+        invalidate_dapp_registry()
+    return len(alerts)
 
-                if float(amount) >= ASTAR_TRANSFER_LOWER_LIMIT:
-                    account_address = transaction.get('account_id')
 
-        if account_address and dapp_address:
-            account, _ = Account.objects.get_or_create(
-                address=account_address
-            )
-            _, created = Transfer.objects.get_or_create(
-                extrinsic_index=extrinsic_index,
-                defaults={
-                    'from_account': account,
-                    'to_account': account,
-                    'asset_symbol': asset_symbol,
-                    'module': call_module_function,
-                    'amount': amount,
-                },
-            )
+def account_row_address(row: dict) -> str:
+    substrate_account = row.get('substrate_account')
+    if substrate_account:
+        return substrate_account.get('address')
+    return row.get('address')
 
-            dapp_account, _ = Account.objects.get_or_create(
-                address=dapp_address
-            )
-            dapp = Dapp.objects.filter(account=dapp_account).first()
-
-            if created:
-                send_message(
-                    ASTAR_CHAT_ID,
-                    create_extrinsic_message(
-                        account,
-                        dapp,
-                        call_module_function,
-                        amount,
-                        asset_symbol,
-                    )
-                )
 
+def to_balance(value: str) -> Decimal:
+    return Decimal(value).quantize(BALANCE_QUANTUM)
 
-@shared_task
-def check_new_dapps() -> None:
-    url = 'https://api.astar.network/api/v1/astar/dapps-staking/dapps'
-    response = requests.get(url)
-    logger.info(f'check_dapps: {url} {response.status_code}')
-    if response.status_code != 200:
-        return
 
-    dapp_addresses = set(
-        Dapp.objects.values_list('account__address', flat=True)
-    )
-    for row in response.json():
-        address = row.get('address', '').lower()
-        if address not in dapp_addresses:
-            account, _ = Account.objects.get_or_create(address=address)
-            dapp = Dapp.objects.create(
-                name=row.get('name'),
-                account=account,
-            )
-            send_message(ASTAR_CHAT_ID, create_new_dapp_message(dapp))
+def notify_balance_moves(account_ids) -> None:
+    notify(ASTAR_CHAT_ID, [
+        Alert(create_balance_change_message(account, previous, balance))
+        for account, previous, balance in balance_moves(account_ids)
+    ])
 
 
 @shared_task
-def get_account_balances() -> None:
-    known_addresses = (Account.objects.exclude(name='')
-                       .values_list('address', flat=True))
-    max_addresses_per_request = 100
-    for i in range(0, len(known_addresses), max_addresses_per_request):
-        data = {'address': known_addresses[i:i + max_addresses_per_request]}
-        response = make_request('accounts', data)
+@single_flight(coalesce=False)
+def get_account_balances() -> int:
+    snapshot = {
+        address: (account_id, balance, balance_lock)
+        for account_id, address, balance, balance_lock in (
+            Account.objects.exclude(name='')
+            .values_list('id', 'address', 'balance', 'balance_lock')
+        )
+    }
+    addresses = list(snapshot)
+    chunks = [
+        addresses[i:i + SUBSCAN_MAX_ADDRESSES]
+        for i in range(0, len(addresses), SUBSCAN_MAX_ADDRESSES)
+    ]
+    with ThreadPoolExecutor(max_workers=SUBSCAN_POOL_WORKERS) as executor:
+        responses = list(executor.map(
+            lambda chunk: make_request('accounts', {'address': chunk}),
+            chunks,
+        ))
+
+    changed = []
+    for response in responses:
         if not response:
             logger.info('get_account_balances has failed')
             continue
 
-        for row in response['data']['list']:
-            address = row.get('address')
-            substrate_account = row.get('substrate_account')
-            if substrate_account:
-                address = substrate_account.get('address')
-            Account.objects.filter(address=address).update(
-                balance=float(row['balance']),
-                balance_lock=float(row['balance_lock']),
-            )
+        for row in response['data']['list'] or []:
+            known = snapshot.get(account_row_address(row))
+            if known is None:
+                continue
+            account_id, balance, balance_lock = known
+            new_balance = to_balance(row['balance'])
+            new_balance_lock = to_balance(row['balance_lock'])
+            if new_balance != balance or new_balance_lock != balance_lock:
+                changed.append(Account(
+                    id=account_id,
+                    balance=new_balance,
+                    balance_lock=new_balance_lock,
+                ))
+
+    Account.objects.bulk_update(changed, ['balance', 'balance_lock'], batch_size=1000)
+    record_balances({
+        account.id: (account.balance, account.balance_lock)
+        for account in changed
+    })
+    Account.refresh_ranks()
+    notify_balance_moves([account.id for account in changed])
+    logger.info(f'get_account_balances: {len(changed)} of {len(addresses)} changed')
+    return len(changed)
 
 
 @shared_task
-def get_top_holders() -> None:
+@single_flight(coalesce=False)
+def get_top_holders() -> int:
     data = {
         'row': 100,
         'page': 0,
         'order_field': 'balance',
         'order': 'desc'
     }
-    response = make_request('accounts', data)
-    if not response:
+    response = make_cached_request('accounts', data, TOP_HOLDERS_CACHE_TTL)
+    if response is None:
         logger.info('get_top_holders has failed')
         return
-    for row in response['data']['list']:
-        address = row.get('address')
-        substrate_account = row.get('substrate_account')
-        if substrate_account:
-            address = substrate_account.get('address')
-        Account.objects.update_or_create(
-            address=address,
+    if not response.changed:
+        return 0
+    rows = response.payload['data']['list']
+    known = {
+        address: (balance, balance_lock)
+        for address, balance, balance_lock in (
+            Account.objects.filter(address__in=[account_row_address(row) for row in rows])
+            .values_list('address', 'balance', 'balance_lock')
+        )
+    }
+    changes = {}
+    for row in rows:
+        balances = (to_balance(row['balance']), to_balance(row['balance_lock']))
+        account, _ = Account.objects.update_or_create(
+            address=account_row_address(row),
             defaults={
                 'display': row.get('account_display', {}).get('display', ''),
-                'balance': float(row['balance']),
-                'balance_lock': float(row['balance_lock']),
+                'balance': balances[0],
+                'balance_lock': balances[1],
             }
         )
+        if known.get(account.address) != balances:
+            changes[account.id] = balances
+    record_balances(changes)
+    Account.refresh_ranks()
+    notify_balance_moves(changes)
+    response.commit()
+    return len(rows)
+
+
+def process_ton_transactions(name: str, address: str, transactions: list) -> list:
+    alerts = []
+    for transfer in ingest_ton_transactions(transactions):
+        source_address = transfer['source_address']
+        source_name = name if source_address == address else transfer['source_name']
+        destination_address = transfer['destination_address']
+        destination_name = name if destination_address == address else transfer['destination_name']
+        alerts.append(Alert(
+            create_ton_transfer_message(
+                source_address,
+                source_name,
+                destination_address,
+                destination_name,
+                from_base_units(transfer['amount'], ASSET_DECIMALS['TON']),
+            ),
+            f'{tonviewer_link(source_address, source_name or source_address)} → '
+            f'{tonviewer_link(destination_address, destination_name or destination_address)}',
+            transfer['amount'],
+            'TON',
+            ASSET_DECIMALS['TON'],
+        ))
+    return alerts
+
+
+def advance_ton_account(account: TONAccount, transactions: list) -> bool:
+    """
+    Store, alert and move the account's lt cursor in one transaction.
+
+    The cursor only moves from the value the page was fetched after, so
+    a page made stale by another run is dropped instead of alerting
+    twice or moving the cursor backwards.
+    """
+    with transaction.atomic():
+        advanced = TONAccount.objects.filter(pk=account.pk, last_lt=account.last_lt).update(
+            last_lt=transactions[-1]['lt'],
+            last_hash=transactions[-1]['hash'],
+            updated_at=timezone.now(),
+        )
+        if not advanced:
+            return False
+        notify(TON_CHAT_ID, process_ton_transactions(
+            account.name,
+            account.address_raw,
+            transactions,
+        ))
+    return True
+
+
+@single_flight(key=lambda address_raw, after_lt=None, transactions=None: address_raw)
+def sync_ton_account(address_raw: str, after_lt: int = None, transactions: list = None) -> int:
+    """
+    Store the new transactions of one account under its own lock.
+
+    Both the poller and the per-account task go through here. The poller
+    passes the page it fetched after ``after_lt``; the page is fetched
+    again when the cursor has moved since.
+    """
+    account = (
+        TONAccount.objects.filter(address_raw=address_raw)
+        .only('name', 'address_raw', 'last_lt', 'last_hash')
+        .first()
+    )
+    if account is None:
+        return 0
+    if transactions is None or account.last_lt != after_lt:
+        transactions = fetch_account_transactions(account.address_raw, account.last_lt)
+    if not transactions or not advance_ton_account(account, transactions):
+        return 0
+    return len(transactions)
 
 
 @shared_task
-def get_latest_ton_transfers() -> None:
-    accounts = TONAccount.objects.all().values_list('name', 'address_raw')
-    for name, address in accounts:
-        if not address:
-            continue
-        time.sleep(1)  # rps limit
-        response = make_tonapi_request(f'blockchain/accounts/{address}/transactions')
-        if not response:
-            logger.info('make_tonapi_request has failed')
-            return
-        transactions = response.get('transactions')
-        if transactions is None:
-            logger.info('no transactions in response')
-            return
-        for transaction in transactions:
-            in_msg = transaction.get('in_msg')
-            if in_msg is None:
+@single_flight()
+def get_latest_ton_transfers() -> int:
+    if stream_alive(TON_STREAM):
+        return 0
+    accounts = list(
+        TONAccount.objects.exclude(address_raw='')
+        .values_list('address_raw', 'last_lt')
+    )
+    # rows are written from this thread, see monitor.ingest
+    with ThreadPoolExecutor(max_workers=TON_POLL_WORKERS) as executor:
+        futures = {
+            executor.submit(fetch_account_transactions, address_raw, last_lt): (address_raw, last_lt)
+            for address_raw, last_lt in accounts
+        }
+        processed = 0
+        for future in as_completed(futures):
+            address_raw, last_lt = futures[future]
+            try:
+                transactions = future.result()
+            except Exception:
+                logger.exception(f'get_latest_ton_transfers: {address_raw}')
                 continue
-            value = in_msg.get('value')
-            source = in_msg.get('source')
-            destination = in_msg.get('destination')
-            if value is None or source is None or destination is None:
+            if transactions is None:
+                logger.info(f'make_tonapi_request has failed: {address_raw}')
                 continue
-
-            amount = value / 10 ** 9
-            if float(amount) < TON_TRANSFER_LOWER_LIMIT:
+            if not transactions:
                 continue
 
-            source_address = source.get('address')
-            source_name = name if source_address == address else source.get('name')
-            destination_address = destination.get('address')
-            destination_name = name if destination_address == address else destination.get('name')
-            _, created = TONTransfer.objects.get_or_create(
-                hash=transaction.get('hash'),
-                defaults={
-                    'source_address': source.get('address'),
-                    'destination_address': destination.get('address'),
-                    'amount': amount,
-                },
+            # a skipped account is being synced by get_ton_account_transfers
+            processed += sync_ton_account(address_raw, last_lt, transactions) or 0
+    return processed
+
+
+@shared_task
+def get_ton_account_transfers(address_raw: str) -> int:
+    return sync_ton_account(address_raw) or 0
+
+
+@shared_task(bind=True)
+def import_ton_watchlist(self, entries: dict) -> int:
+    """Run a watchlist import and keep its report for the admin page."""
+    result = import_watchlist(entries)
+    cache.set(import_report_key(self.request.id), result._asdict(), WATCHLIST_REPORT_TTL)
+    return len(result.created)
+
+
+@shared_task
+def deliver_messages() -> int:
+    """
+    Drain the Telegram outbox, oldest message first within each chat.
+
+    Only one consumer runs at a time (Postgres advisory lock). Each pass
+    sends the head message of every chat that is due and not throttled;
+    a chat whose head is waiting holds back its later messages. Work left
+    after the time budget is picked up by a follow-up run.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_try_advisory_lock(%s)', [OUTBOX_LOCK_ID])
+        if not cursor.fetchone()[0]:
+            return 0
+    sent = 0
+    try:
+        deadline = time.monotonic() + OUTBOX_DELIVERY_BUDGET
+        while time.monotonic() < deadline:
+            heads = list(
+                OutboxMessage.objects.filter(status=OutboxMessage.PENDING)
+                .order_by('chat_id', 'id')
+                .distinct('chat_id')
             )
-            if created:
-                send_message(
-                    TON_CHAT_ID,
-                    create_ton_transfer_message(
-                        source_address,
-                        source_name,
-                        destination_address,
-                        destination_name,
-                        amount,
-                    )
-                )
+            if not heads:
+                return sent
+
+            now = timezone.now()
+            waits = []
+            for message in heads:
+                if message.next_attempt_at > now:
+                    waits.append((message.next_attempt_at - now).total_seconds())
+                    continue
+                bucket = chat_bucket(message.chat_id)
+                if not bucket.try_acquire():
+                    waits.append(bucket.wait_time())
+                    continue
+                deliver_message(message)
+                sent += message.status == OutboxMessage.SENT
+
+            if waits and len(waits) == len(heads):
+                time.sleep(max(0, min(min(waits), deadline - time.monotonic())))
+        deliver_messages.apply_async(countdown=1)
+        return sent
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [OUTBOX_LOCK_ID])
+
+
+@shared_task
+@single_flight(coalesce=False)
+def prune_outbox() -> int:
+    """Delete sent messages older than the retention; failed ones stay for review."""
+    cutoff = timezone.now() - timedelta(days=OUTBOX_RETENTION_DAYS)
+    pruned = 0
+    while True:
+        ids = list(
+            OutboxMessage.objects.filter(status=OutboxMessage.SENT, sent_at__lt=cutoff)
+            .values_list('id', flat=True)[:OUTBOX_PRUNE_BATCH_SIZE]
+        )
+        if not ids:
+            return pruned
+        pruned += OutboxMessage.objects.filter(id__in=ids).delete()[0]
+
+
+@shared_task
+@single_flight()
+def flush_digest_events() -> int:
+    flushed = flush_digests()
+    if flushed:
+        deliver_messages.delay()
+    return flushed
+
+
+@shared_task
+@single_flight(coalesce=False)
+def archive_old_transfers() -> int:
+    return archive_expired()
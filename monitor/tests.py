@@ -1,3 +1,267 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import redis
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import subscan
+from monitor import streaming, tasks
+from monitor.management.commands.check_query_plans import (explain,
+                                                           hot_queries,
+                                                           seq_scans)
+from monitor.models import VolumeRollup
+from monitor.rollups import transfer_deltas
+from monitor.streaming import ASTAR_STREAM, run_forever, stream_alive
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OP_CONTINUATION, OP_TEXT, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x8, 0x9, 0xA
+
+
+def server_frame(opcode: int, payload: bytes = b'', fin: bool = True) -> bytes:
+    return bytes([(0x80 if fin else 0) | opcode, len(payload)]) + payload
+
+
+class WebSocketServer:
+    """
+    Local server running ``handler(conn)`` for each of ``connections``
+    clients after the upgrade handshake.
+    """
+
+    def __init__(self, handler, connections: int = 1, status: str = '101 Switching Protocols'):
+        self.handler = handler
+        self.connections = connections
+        self.status = status
+        self.received = []
+        self.errors = []
+        self.listener = socket.create_server(('127.0.0.1', 0))
+        self.listener.settimeout(5)
+        self.url = f'ws://127.0.0.1:{self.listener.getsockname()[1]}/'
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.thread.join(5)
+        self.listener.close()
+
+    def serve(self):
+        try:
+            for _ in range(self.connections):
+                conn, _ = self.listener.accept()
+                with conn:
+                    conn.settimeout(5)
+                    self.handshake(conn)
+                    self.handler(self, conn)
+        except Exception as e:
+            self.errors.append(e)
+
+    def handshake(self, conn):
+        request = b''
+        while b'\r\n\r\n' not in request:
+            request += conn.recv(1024)
+        headers = dict(
+            line.split(': ', 1)
+            for line in request.decode().split('\r\n')[1:]
+            if ': ' in line
+        )
+        accept = base64.b64encode(
+            hashlib.sha1((headers['Sec-WebSocket-Key'] + WS_GUID).encode()).digest()
+        ).decode()
+        conn.sendall((
+            f'HTTP/1.1 {self.status}\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept}\r\n\r\n'
+        ).encode())
+
+    @staticmethod
+    def read_exact(conn, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError('client went away')
+            data += chunk
+        return data
+
+    def read_frame(self, conn) -> tuple:
+        first, second = self.read_exact(conn, 2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', self.read_exact(conn, 2))[0]
+        mask = self.read_exact(conn, 4)
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self.read_exact(conn, length)))
+        self.received.append((first & 0x0F, payload))
+        return first & 0x0F, payload
+
+
+def finalized_heads(*numbers):
+    """Server handler answering the subscription with ``numbers`` and closing."""
+    def handler(server, conn):
+        server.read_frame(conn)
+        conn.sendall(server_frame(OP_PING, b'hb'))
+        server.read_frame(conn)
+        for number in numbers:
+            message = json.dumps({
+                'jsonrpc': '2.0',
+                'method': 'chain_finalizedHead',
+                'params': {'subscription': 'sub', 'result': {'number': hex(number)}},
+            }).encode()
+            conn.sendall(
+                server_frame(OP_TEXT, message[:10], fin=False)
+                + server_frame(OP_CONTINUATION, message[10:])
+            )
+        conn.sendall(server_frame(OP_CLOSE))
+        server.read_frame(conn)
+    return handler
+
+
+class Stop(Exception):
+    pass
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class StreamAstarTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # single_flight runs unlocked without Redis
+        patcher = mock.patch('core.locks.metrics.get_redis', side_effect=redis.ConnectionError)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stream_reports_heads_until_closed(self):
+        blocks = []
+        with WebSocketServer(finalized_heads(16, 17)) as server:
+            with mock.patch.object(streaming, 'ASTAR_NODE_WS_URL', server.url):
+                with self.assertRaises(ConnectionError):
+                    streaming.stream_astar(blocks.append)
+
+        self.assertEqual(server.errors, [])
+        subscribe = json.loads(server.received[0][1])
+        self.assertEqual(subscribe['method'], 'chain_subscribeFinalizedHeads')
+        self.assertEqual(server.received[1], (OP_PONG, b'hb'))
+        self.assertEqual(server.received[2][0], OP_CLOSE)
+        self.assertEqual(blocks, [None, 16, 17])
+        self.assertTrue(stream_alive(ASTAR_STREAM))
+
+    def test_rejected_handshake_is_retried(self):
+        with WebSocketServer(lambda server, conn: None, status='400 Bad Request') as server:
+            with (
+                mock.patch.object(streaming, 'ASTAR_NODE_WS_URL', server.url),
+                mock.patch.object(streaming.time, 'sleep', side_effect=Stop),
+            ):
+                with self.assertRaises(Stop):
+                    run_forever(ASTAR_STREAM, lambda: streaming.stream_astar(lambda number: None))
+
+        self.assertEqual(server.errors, [])
+        self.assertFalse(stream_alive(ASTAR_STREAM))
+
+    @mock.patch('monitor.tasks.fetch_since', return_value=[])
+    def test_polling_steps_aside_while_stream_is_alive(self, fetch_since):
+        with WebSocketServer(finalized_heads(16)) as server:
+            with mock.patch.object(streaming, 'ASTAR_NODE_WS_URL', server.url):
+                with self.assertRaises(ConnectionError):
+                    streaming.stream_astar(lambda number: None)
+
+        self.assertEqual(tasks.get_latest_transfers(), 0)
+        fetch_since.assert_not_called()
+
+    @mock.patch('monitor.tasks.fetch_since', return_value=[])
+    def test_reconnect_then_polling_takes_over(self, fetch_since):
+        blocks = []
+        with WebSocketServer(finalized_heads(16), connections=2) as server:
+            with (
+                mock.patch.object(streaming, 'ASTAR_NODE_WS_URL', server.url),
+                mock.patch.object(streaming.time, 'sleep', side_effect=[None, Stop]),
+            ):
+                with self.assertRaises(Stop):
+                    run_forever(ASTAR_STREAM, lambda: streaming.stream_astar(blocks.append))
+
+        self.assertEqual(server.errors, [])
+        self.assertEqual(blocks, [None, 16, None, 16])
+        # the heartbeat is dropped on disconnect, so beat polls again
+        self.assertFalse(stream_alive(ASTAR_STREAM))
+        tasks.get_latest_transfers()
+        fetch_since.assert_called_once()
+
+
+def subscan_feed(blocks: int):
+    """make_request stand-in serving one row per block, newest first."""
+    rows = [{'extrinsic_index': f'{block}-1'} for block in range(blocks, 0, -1)]
+
+    def make_request(resource, data):
+        selected = rows
+        if 'block_range' in data:
+            start, end = map(int, data['block_range'].split('-'))
+            selected = [
+                row for row in rows
+                if start <= subscan.extrinsic_index_key(row['extrinsic_index'])[0] <= end
+            ]
+        page = data['page']
+        return {'data': {'transfers': selected[page * 100:(page + 1) * 100]}}
+    return make_request
+
+
+class FetchSinceTests(SimpleTestCase):
+    @mock.patch.object(subscan, 'SUBSCAN_GAP_BLOCKS', 700)
+    @mock.patch.object(subscan, 'SUBSCAN_GAP_CHUNKS', 2)
+    def test_cursor_beyond_max_pages_is_filled_without_gaps(self):
+        cursor = '100-1'
+        fetched = []
+        with mock.patch.object(subscan, 'make_request', subscan_feed(5000)):
+            for _ in range(5):
+                rows = subscan.fetch_since('transfers', {'row': 100}, 'transfers', cursor)
+                if not rows:
+                    break
+                fetched.extend(rows)
+                cursor = rows[-1]['extrinsic_index']
+
+        blocks = [subscan.extrinsic_index_key(row['extrinsic_index'])[0] for row in fetched]
+        self.assertEqual(blocks, list(range(101, 5001)))
+
+
+class RollupTests(SimpleTestCase):
+    def test_mixed_decimals_of_one_asset_share_a_bucket(self):
+        created_at = datetime(2024, 5, 1, 12, 30, tzinfo=dt_timezone.utc)
+        account = SimpleNamespace(address='a')
+        transfers = [
+            SimpleNamespace(
+                amount=amount, decimals=decimals, asset_symbol='ASTR', module='balances',
+                created_at=created_at, from_account=account, to_account=account,
+            )
+            for amount, decimals in ((10 ** 18, 18), (2 * 10 ** 6, 6))
+        ]
+
+        deltas = transfer_deltas(transfers)
+
+        hour = datetime(2024, 5, 1, 12, tzinfo=dt_timezone.utc)
+        group = (VolumeRollup.ASSET, 'ASTR', 'ASTR', VolumeRollup.HOUR, hour)
+        self.assertEqual(deltas[group], (3 * 10 ** 18, 0, 2))
+        # account, module and asset, each per hour and per day
+        self.assertEqual(len(deltas), 6)
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_indexes(self):
+        # the test tables are nearly empty, where a sequential scan is the
+        # right plan; with it disabled one is only planned when no index
+        # can serve the query
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, queryset in hot_queries().items():
+            with self.subTest(name):
+                self.assertEqual(seq_scans(explain(queryset)), [])
@@ -1,3 +1,183 @@
-from django.shortcuts import render
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 
-# Create your views here.
+import redis
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_GET
+
+from core import metrics
+from core.amounts import from_base_units
+from monitor.balances import balance_history
+from monitor.models import Account, VolumeRollup
+from monitor.rollups import bucket_start
+
+# how far back one request reaches, keeping every response a short index range
+VOLUME_MAX_RANGE = {
+    VolumeRollup.HOUR: timedelta(days=31),
+    VolumeRollup.DAY: timedelta(days=366),
+}
+VOLUME_DEFAULT_RANGE = {
+    VolumeRollup.HOUR: timedelta(days=1),
+    VolumeRollup.DAY: timedelta(days=30),
+}
+BALANCE_HISTORY_STEPS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+    'week': timedelta(days=7),
+}
+BALANCE_HISTORY_MAX_POINTS = 1000
+
+
+def queue_names() -> set:
+    names = {getattr(settings, 'CELERY_TASK_DEFAULT_QUEUE', 'celery')}
+    for route in getattr(settings, 'CELERY_TASK_ROUTES', {}).values():
+        names.add(route['queue'])
+    return names
+
+
+@require_GET
+def metrics_view(request):
+    try:
+        client = metrics.get_redis()
+        depth = {
+            (('queue', name),): client.llen(name)
+            for name in sorted(queue_names())
+        }
+        body = metrics.render({'celery_queue_length': depth})
+    except redis.RedisError:
+        return HttpResponse('metrics store unavailable\n', status=503, content_type='text/plain')
+    return HttpResponse(body, content_type='text/plain; version=0.0.4')
+
+
+def parse_moment(value: str) -> [datetime, None]:
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            return
+        moment = datetime(day.year, day.month, day.day)
+    if timezone.is_naive(moment):
+        moment = moment.replace(tzinfo=dt_timezone.utc)
+    return moment
+
+
+def format_amount(amount: int, decimals: int) -> str:
+    return f'{from_base_units(amount, decimals):f}'
+
+
+@require_GET
+def volume_view(request):
+    """
+    Hourly or daily volume of one account, dapp, module or asset.
+
+    Query parameters: ``dimension``, ``key`` (address, module name or
+    asset symbol), ``asset`` (default ASTR), ``period`` (hour or day)
+    and optional ISO ``since``/``until``. Inflow is what an account
+    received or a dapp had staked; outflow what an account sent or a
+    dapp had unstaked. Module and asset volume is reported as inflow.
+    """
+    dimension = request.GET.get('dimension')
+    key = request.GET.get('key')
+    asset_symbol = request.GET.get('asset', 'ASTR')
+    period = request.GET.get('period', VolumeRollup.DAY)
+    if dimension not in dict(VolumeRollup.DIMENSION_CHOICES) or not key:
+        return JsonResponse({'error': 'dimension and key are required'}, status=400)
+    if period not in VOLUME_MAX_RANGE:
+        return JsonResponse({'error': 'period must be hour or day'}, status=400)
+
+    until = timezone.now()
+    if request.GET.get('until'):
+        until = parse_moment(request.GET['until'])
+    since = until - VOLUME_DEFAULT_RANGE[period] if until else None
+    if request.GET.get('since'):
+        since = parse_moment(request.GET['since'])
+    if since is None or until is None:
+        return JsonResponse({'error': 'since and until must be ISO dates'}, status=400)
+    since = max(bucket_start(since, period), until - VOLUME_MAX_RANGE[period])
+
+    rows = (
+        VolumeRollup.objects.filter(
+            dimension=dimension,
+            key=key,
+            asset_symbol=asset_symbol,
+            period=period,
+            bucket__gte=since,
+            bucket__lt=until,
+        )
+        .order_by('bucket')
+        .values_list('bucket', 'decimals', 'inflow', 'outflow', 'count')
+    )
+    buckets = []
+    total_in = total_out = total_count = 0
+    decimals = 0
+    for bucket, decimals, inflow, outflow, count in rows:
+        inflow, outflow = int(inflow), int(outflow)
+        total_in += inflow
+        total_out += outflow
+        total_count += count
+        buckets.append({
+            'bucket': bucket.isoformat(),
+            'inflow': format_amount(inflow, decimals),
+            'outflow': format_amount(outflow, decimals),
+            'net': format_amount(inflow - outflow, decimals),
+            'count': count,
+        })
+
+    return JsonResponse({
+        'dimension': dimension,
+        'key': key,
+        'asset': asset_symbol,
+        'period': period,
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'total': {
+            'inflow': format_amount(total_in, decimals),
+            'outflow': format_amount(total_out, decimals),
+            'net': format_amount(total_in - total_out, decimals),
+            'count': total_count,
+        },
+        'buckets': buckets,
+    })
+
+
+@require_GET
+def balance_history_view(request):
+    """
+    Balance of one Astar account over time, downsampled for charts.
+
+    Query parameters: ``address``, ``step`` (hour, day or week, default
+    day) and optional ISO ``since``/``until`` (default the last 30 days).
+    """
+    account = Account.objects.filter(address=request.GET.get('address', '')).first()
+    if account is None:
+        return JsonResponse({'error': 'unknown address'}, status=404)
+    step = BALANCE_HISTORY_STEPS.get(request.GET.get('step', 'day'))
+    if step is None:
+        return JsonResponse({'error': 'step must be hour, day or week'}, status=400)
+
+    until = timezone.now()
+    if request.GET.get('until'):
+        until = parse_moment(request.GET['until'])
+    since = until - timedelta(days=30) if until else None
+    if request.GET.get('since'):
+        since = parse_moment(request.GET['since'])
+    if since is None or until is None:
+        return JsonResponse({'error': 'since and until must be ISO dates'}, status=400)
+    since = max(since, until - step * BALANCE_HISTORY_MAX_POINTS)
+
+    return JsonResponse({
+        'address': account.address,
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'points': [
+            {
+                'time': moment.isoformat(),
+                'balance': f'{balance:f}',
+                'balance_lock': f'{balance_lock:f}',
+            }
+            for moment, balance, balance_lock in balance_history(account, since, until, step)
+        ],
+    })
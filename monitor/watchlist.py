@@ -0,0 +1,104 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from core.tonapi import parse_address
+from monitor.models import TONAccount
+
+WATCHLIST_RESOLVE_WORKERS = int(os.getenv('WATCHLIST_RESOLVE_WORKERS', 8))
+WATCHLIST_REPORT_TTL = 24 * 60 * 60
+
+
+class ImportResult(NamedTuple):
+    created: list
+    existing: list
+    # another form of a wallet that is already watched, or listed twice
+    duplicates: list
+    unresolved: list
+
+
+def import_report_key(task_id: str) -> str:
+    return f'watchlist:import:{task_id}'
+
+
+def read_watchlist(content: str, fmt: str) -> dict:
+    """
+    Parse a watchlist into ``{address: name}``.
+
+    CSV needs an ``address`` column and may have a ``name`` one; JSON is
+    a list of addresses or of ``{"address": ..., "name": ...}`` objects.
+    """
+    if fmt == 'json':
+        rows = [
+            row if isinstance(row, dict) else {'address': row}
+            for row in json.loads(content)
+        ]
+    else:
+        reader = csv.DictReader(io.StringIO(content))
+        if 'address' not in (reader.fieldnames or []):
+            raise ValueError('CSV watchlist needs an "address" column')
+        rows = list(reader)
+
+    entries = {}
+    for row in rows:
+        address = (row.get('address') or '').strip()
+        if address:
+            entries.setdefault(address, (row.get('name') or '').strip())
+    return entries
+
+
+def resolve_addresses(addresses: list) -> dict:
+    """Map addresses to raw forms concurrently, within the TonAPI rate limit."""
+    with ThreadPoolExecutor(max_workers=WATCHLIST_RESOLVE_WORKERS) as executor:
+        return dict(zip(addresses, executor.map(parse_address, addresses)))
+
+
+def import_watchlist(entries: dict) -> ImportResult:
+    """
+    Add every new ``{address: name}`` entry as a TONAccount in one insert.
+
+    Addresses already watched are skipped, as are ones whose raw form
+    is already watched under another user-friendly form. Ones TonAPI
+    cannot parse are reported instead of being stored without a raw
+    form. Resolving runs at the TonAPI rate, so large lists belong in
+    a background task (``import_ton_watchlist``).
+    """
+    existing = set(
+        TONAccount.objects.filter(address__in=list(entries))
+        .values_list('address', flat=True)
+    )
+    raw_forms = resolve_addresses([address for address in entries if address not in existing])
+    watched_raw = set(
+        TONAccount.objects.filter(address_raw__in=[raw for raw in raw_forms.values() if raw])
+        .values_list('address_raw', flat=True)
+    )
+
+    accounts = []
+    duplicates = []
+    unresolved = []
+    for address, raw_form in raw_forms.items():
+        if raw_form is None:
+            unresolved.append(address)
+        elif raw_form in watched_raw:
+            duplicates.append(address)
+        else:
+            watched_raw.add(raw_form)
+            accounts.append(TONAccount(name=entries[address], address=address, address_raw=raw_form))
+    TONAccount.objects.bulk_create(accounts, ignore_conflicts=True)
+
+    # rows lost to a concurrent insert are not reported as created
+    created = set(
+        TONAccount.objects.filter(
+            address__in=[account.address for account in accounts],
+            address_raw__in=[account.address_raw for account in accounts],
+        ).values_list('address', flat=True)
+    )
+    return ImportResult(
+        created=[account.address for account in accounts if account.address in created],
+        existing=sorted(existing),
+        duplicates=duplicates + [account.address for account in accounts if account.address not in created],
+        unresolved=unresolved,
+    )